@@ -1,12 +1,13 @@
 import numpy as np
 from sapai import Player
-from sapai import Battle
+from sapai.arraybattle import battle_many
 
-def roundrobin(players: list[Player], rounds=-1):
+def roundrobin(players: list[Player], rounds=-1, cache=None):
 	'''Conducts RoundRobin battles between players
 	Returns winrates
 	Only supports single-roundrobin
 	Matchups are always done in order, players are assumed to be uncorrelated
+	A BattleCache may be provided to reuse results across calls
 	'''
 	if rounds==-1:
 		rounds = len(players)-1
@@ -15,6 +16,8 @@ def roundrobin(players: list[Player], rounds=-1):
 	
 	wins = np.zeros(len(players))
 	fought = np.zeros(len(players))
+	# Collect all matchups first so that they can be battled together
+	matchups = []
 	for idx, pl1 in enumerate(players[:-1]):
 		# Check for empty teams
 		if len(pl1.team)==0:
@@ -24,24 +27,27 @@ def roundrobin(players: list[Player], rounds=-1):
 		for jdx, pl2 in enumerate(players[idx+1:]):
 			if len(pl2.team)==0: # Skip empty teams
 				continue
-			# Conduct Battle
-			b = Battle(pl1.team, pl2.team)
-			result = b.battle() # 0-pl1, 1-pl2, 2-draw
-			if result==0:
-				wins[idx]+=1
-			elif result==1:
-				wins[idx+1+jdx]+=1
-			elif result==2:
-				wins[idx]+=0.5
-				wins[idx+1+jdx]+=0.5
-			else:
-				raise Exception(f"battle not over: {result}")
-			
-			fought[idx]+=1
-			fought[idx+1+jdx]+=1
+			matchups.append((idx, idx+1+jdx))
 			round+=1
 			if round==rounds: # If fewer fights are desired
 				break
+	# Conduct Battles
+	results = battle_many([(players[idx].team, players[jdx].team) 
+						   for idx, jdx in matchups],
+						  cache=cache) # 0-pl1, 1-pl2, 2-draw
+	for (idx, jdx), result in zip(matchups, results):
+		if result==0:
+			wins[idx]+=1
+		elif result==1:
+			wins[jdx]+=1
+		elif result==2:
+			wins[idx]+=0.5
+			wins[jdx]+=0.5
+		else:
+			raise Exception(f"battle not over: {result}")
+		
+		fought[idx]+=1
+		fought[jdx]+=1
 	# Calculate winrate
 	fought[np.where(fought==0)[0]] = 1
 	wr = wins/fought
@@ -5,5 +5,6 @@ from .pets import Pet
 from .foods import Food
 from .teams import Team
 from .battle import Battle
+from .arraybattle import ArrayBattle
 from .shop import Shop
 from .player import Player
@@ -0,0 +1,121 @@
+#%%
+
+from sapai.data import data
+from sapai.effects import func_dict
+from sapai.targets import get_effect_target
+
+
+def get_target_kind(effect, get_from=False):
+    """
+    Returns the kind and n of the target of the effect, which may be given 
+    with the key target or to in the data-dictionary. None is returned as the
+    kind if the effect has no target. 
+    
+    """
+    if "target" not in effect and "to" not in effect:
+        return None,1
+    if get_from and "from" not in effect:
+        return None,1
+    target = get_effect_target(effect, get_from)
+    return target["kind"],target.get("n",1)
+
+
+class Ability():
+    """
+    Compiled ability of a pet. The fields of the ability dictionary that are
+    needed whenever a trigger is checked or an effect is performed are stored
+    as attributes, such that these are not looked up in the nested
+    dictionaries every time. The original dictionary is stored as ability.
+
+    Abilities of every species and level are compiled once at import in
+    ability_table. Abilities that are set during the game, for example by
+    Whale, Parrot, or a status, are compiled when they are first used.
+
+    """
+    def __init__(self, ability):
+        self.ability = ability
+        self.trigger = ability["trigger"]
+        self.triggered_by = ability["triggeredBy"]["kind"]
+        self.max_triggers = ability.get("maxTriggers", None)
+
+        effect = ability["effect"]
+        self.kind = effect["kind"]
+        ### Effect function, None if the kind has no function such as none
+        self.func = func_dict.get(self.kind, None)
+        self.effect = effect
+        ### Kind and n of the target normalized for get_target. None if the
+        ###   effect has no target.
+        self.target,self.n = get_target_kind(effect)
+        self.from_target,self.from_n = get_target_kind(effect, get_from=True)
+        self.attack_amount = effect.get("attackAmount", None)
+        self.health_amount = effect.get("healthAmount", None)
+        self.until_end_of_battle = effect.get("untilEndOfBattle", False)
+
+
+    def __repr__(self):
+        return "< Ability {} {} {} >".format(
+            self.trigger, self.kind, self.target)
+
+
+empty_ability = {'description': 'none',
+ 'trigger': 'none',
+ 'triggeredBy': {'kind': 'none', 'n': 'none'},
+ 'effect': {'kind': 'none',
+  'attackAmount': 'none',
+  'healthAmount': 'none',
+  'target': {'kind': 'none', 'n': 'none', 'includingFuture': 'none'},
+  'untilEndOfBattle': 'none',
+  'pet': 'none',
+  'withAttack': 'none',
+  'withHealth': 'none',
+  'team': 'none',
+  'amount': 'none',
+  'status': 'none',
+  'to': {'kind': 'none', 'n': 'none'},
+  'copyAttack': 'none',
+  'copyHealth': 'none',
+  'from': {'kind': 'none', 'n': 'none'},
+  'effects': 'none',
+  'tier': 'none',
+  'baseAttack': 'none',
+  'baseHealth': 'none',
+  'percentage': 'none',
+  'shop': 'none',
+  'food': 'none',
+  'level': 'none'},
+ 'maxTriggers': 'none'}
+
+### Compiled empty ability for pets without an ability at their level
+empty_record = Ability(empty_ability)
+
+
+def compile_abilities(pets):
+    """
+    Compiles the abilities for every pet in the pets dictionary. Returns
+    dictionary from pet name to a tuple of the compiled abilities indexed by
+    level. Index 0 is the empty ability.
+
+    """
+    ability_table = {}
+    for name,fd in pets.items():
+        records = [empty_record]
+        for level in range(1,4):
+            ability_str = "level{}Ability".format(level)
+            if ability_str in fd:
+                records.append(Ability(fd[ability_str]))
+            else:
+                records.append(empty_record)
+        ability_table[name] = tuple(records)
+    return ability_table
+
+
+def get_ability(name, level):
+    """ Returns the compiled ability of the pet name at the level """
+    if level in (1,2,3):
+        return ability_table[name][int(level)]
+    return empty_record
+
+
+ability_table = compile_abilities(data["pets"])
+
+#%%
@@ -4,6 +4,8 @@ import os,json,zlib,itertools,torch
 import numpy as np
 from sapai import Player
 from sapai.battle import Battle
+from sapai.arraybattle import battle_many
+from sapai.rand import spawn_rngs
 from sapai.compress import compress,decompress,minimal_state
 
 ### Pets with a random component
@@ -60,7 +62,7 @@ class CombinatorialSearch():
         ### This stores the player lists for performing all possible actions
         self.player_list = []
         
-        ### Player dict stores compressed str of all players such that if the
+        ### Player dict stores the key of all players such that if the
         ###   same player state will never be used twice
         self.player_state_dict = {}
         
@@ -212,14 +214,17 @@ class CombinatorialSearch():
     
     
     def avail_team_order(self, player):
-        """ Returns all possible orderings for the team """
-        action_list = []
+        """ 
+        Returns all possible orderings for the team. Orderings that only swap 
+        identical pets result in identical teams, therefore, only distinct 
+        orderings are returned.
         
-        team_range = np.arange(0,len(player.team))
-        if len(team_range) == 0:
+        """
+        action_list = []
+        if len(player.team) == 0:
             return []
         
-        for order in itertools.permutations(team_range, r=len(team_range)):
+        for order in player.team.distinct_orders():
             action_list.append((player.reorder, order))
         
         return action_list
@@ -315,8 +320,9 @@ class CombinatorialSearch():
             ### Don't need history in order to check for redundancy of the 
             ###   shop state. This means that it does not matter how a Shop
             ###   gets to a state, just that the state is identical to others. 
-            cstate = compress(temp_player,minimal=True)
-            # cstate = hash(json.dumps(temp_player.state))
+            ###   Player.key contains the same information as compress with 
+            ###   minimal=True without serializing the state.
+            cstate = temp_player.key()
             if cstate not in self.player_state_dict:
                 self.player_state_dict[cstate] = temp_player
             else:
@@ -343,14 +349,27 @@ class CombinatorialSearch():
         """
         additional_player_list = []
         for player in player_list:
-            player_state = player.state
+            player_state = None
+            ### Key of the reordered player is built from the keys of the 
+            ###   pets such that players are only initialized for new states
+            pet_keys = [0 if slot.empty else slot._pet.key() 
+                        for slot in player.team]
+            other_key = player.key()[1:]
             reorder_actions = self.avail_team_order(player)
             for temp_action in reorder_actions:
                 if temp_action == ():
                     ### Null action
                     continue
                 
+                team_key = [pet_keys[x] for x in temp_action[1] 
+                            if pet_keys[x] != 0]
+                team_key += [0 for x in range(len(pet_keys)-len(team_key))]
+                if (tuple(team_key),)+other_key in player_state_dict:
+                    continue
+                
                 #### Re-initialize identical Player
+                if player_state is None:
+                    player_state = player.state
                 temp_player = Player.from_state(player_state)
                 
                 #### Perform action
@@ -365,8 +384,7 @@ class CombinatorialSearch():
                 ### Don't need history in order to check for redundancy of the 
                 ###   shop state. This means that it does not matter how a Shop
                 ###   gets to a state, just that the state is identical to others. 
-                cstate = compress(temp_player,minimal=True)
-                # cstate = hash(json.dumps(temp_player.state))
+                cstate = temp_player.key()
                 if cstate not in player_state_dict:
                     player_state_dict[cstate] = temp_player
                 else:
@@ -449,11 +467,16 @@ class DatabaseLookupRanker():
     Will provide a rank to a given team based on its performance on a database
     of teams. 
     
+    A BattleCache may be provided such that battles between teams that have
+    already been battled are not performed again. 
+    
     """
     def __init__(self, 
                  path="",
+                 cache=None,
                 ):
         self.path = path
+        self.cache = cache
         
         if os.path.exists(path):
             with open(path, "r") as f:
@@ -489,8 +512,7 @@ class DatabaseLookupRanker():
             self.t0 = team
             self.t1 = value["team"]
             
-            f = Battle(team,value["team"])
-            winner = f.battle()
+            winner = self.battle(team,value["team"])
         
             winner_key = [[team_key],[key],[]][winner]
             for temp_key in winner_key:
@@ -508,13 +530,18 @@ class DatabaseLookupRanker():
         return wins/total
         
 
+    def battle(self, t0, t1):
+        if self.cache is not None:
+            return self.cache.battle(t0,t1)
+        return Battle(t0,t1,history=False).battle()
+    
+    
     def test_against_database(self, team):
         wins = 0
         total = 0
         for key,value in self.team_database.items():
             # print(team, value["team"])
-            f = Battle(team,value["team"])
-            winner = f.battle()
+            winner = self.battle(team,value["team"])
             if winner == 0:
                 wins += 1
             total += 1
@@ -530,8 +557,14 @@ class PairwiseBattles():
     If the calculation is interrupted before finishing, than all results will 
     be lost. This is a common issue of simple parallelization...
     
+    Battles on each rank are performed together using battle_many. On rank 0,
+    battles are performed in batches of batch_size to print the progress.
+    
+    Every rank uses an independent Generator that is spawned from the seed, 
+    such that the results are reproducible if a seed is provided. 
+    
     """
-    def __init__(self, output="results.pt"):
+    def __init__(self, output="results.pt", batch_size=10000, seed=None):
         try: 
             from mpi4py import MPI
             parallel_check = True
@@ -545,6 +578,13 @@ class PairwiseBattles():
         self.size = self.comm.Get_size()
         self.rank = self.comm.Get_rank()
         self.output = output
+        self.batch_size = batch_size
+        ### All ranks must use the same seed for the spawned Generators to be
+        ###   independent
+        seed = self.comm.bcast(seed, root=0)
+        if seed is None:
+            seed = self.comm.bcast(np.random.SeedSequence().entropy, root=0)
+        self.rng = spawn_rngs(seed, self.size)[self.rank]
         
     
     def battle(self, obj):
@@ -588,25 +628,17 @@ class PairwiseBattles():
             my_idx,my_teams = self.comm.recv(source=0)
     
         if self.rank != 0:
-            winner_list = []
-            iter_idx = 0
-            for t0,t1 in my_teams:
-                b = Battle(t0,t1)
-                temp_winner = b.battle()
-                winner_list.append(temp_winner)
-                iter_idx += 1
+            winner_list = battle_many(my_teams, rng=self.rng)
         else:
-            #### This is split to remove branching code in the for loop above
+            #### Battles are performed in batches to print progress
             winner_list = []
-            iter_idx = 0
-            for t0,t1 in my_teams:
-                b = Battle(t0,t1)
-                temp_winner = b.battle()
-                winner_list.append(temp_winner)
-                iter_idx += 1
-                if iter_idx % 1000 == 0:
-                    print("{:16s}: {} of {}".format(
-                                "FINISHED", iter_idx*self.size, len(pair_idx)))
+            for iter_idx in range(0,len(my_teams),self.batch_size):
+                batch = my_teams[iter_idx:iter_idx+self.batch_size]
+                winner_list.append(battle_many(batch, rng=self.rng))
+                print("{:16s}: {} of {}".format(
+                            "FINISHED", (iter_idx+len(batch))*self.size, 
+                            len(pair_idx)))
+            winner_list = np.hstack([np.zeros((0,))]+winner_list)
         
         winner_list = np.array(winner_list).astype(int)
         
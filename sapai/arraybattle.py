@@ -0,0 +1,964 @@
+
+#%%
+
+import time
+import numpy as np
+
+from sapai.data import data
+from sapai.pets import Pet
+from sapai.teams import Team
+from sapai.battle import Battle,BattleSummary,summary_dtype,end_rule_codes
+from sapai.statuses import status_list,status_idx,none_id,splash_id
+
+
+### Species and statuses are stored by integer ids. The id 0 is used for
+###   empty slots and for no status so that a zeroed slot is an empty slot.
+species_list = ["pet-none"]+[x for x in data["pets"] if x != "pet-none"]
+species_idx = {x: iter_idx for iter_idx,x in enumerate(species_list)}
+
+### Fields that are stored for every slot of the team. Each field is stored
+###   as a separate array with shape (2,5) for a battle and (N,2,5) for N
+###   battles.
+fields = ("species",
+          "attack",
+          "attack_buff",
+          "health",
+          "health_buff",
+          "status",
+          "level",
+          "hurt",
+          "counter")
+
+### Statuses that are supported by the array battle. honey-bee and extra-life
+###   summon pets when fainting and are not supported.
+array_statuses = ["none",
+                  "status-weak",
+                  "status-coconut-shield",
+                  "status-bone-attack",
+                  "status-garlic-armor",
+                  "status-splash-attack",
+                  "status-melon-armor",
+                  "status-steak-attack",
+                  "status-poison-attack"]
+
+### Triggers that may activate during a battle
+battle_triggers = ["StartOfBattle",
+                   "Faint",
+                   "Summoned",
+                   "Hurt",
+                   "BeforeAttack",
+                   "AfterAttack",
+                   "KnockOut",
+                   "CastsAbility"]
+### Battle triggers that are supported by the array battle. Index in this list
+###   is the ability kind stored in the ability_table. Unsupported abilities
+###   are given the kind -1 and abilities that never activate during a battle
+###   are given the kind 0.
+array_triggers = ["none",
+                  "BeforeAttack",
+                  "AfterAttack",
+                  "KnockOut",
+                  "Hurt"]
+
+
+def build_ability_table():
+    """
+    Builds the table of the battle abilities for each species and level.
+    Only abilities that modify the stats of the pet itself are supported. These
+    are applied directly to the arrays of the pet.
+
+    Returns dictionary of arrays with shape (number of species, 4) where the
+    second index is the level of the pet.
+
+    """
+    shape = (len(species_list), 4)
+    table = {
+        "kind": np.zeros(shape, dtype=int),
+        "attack": np.zeros(shape, dtype=int),
+        "health": np.zeros(shape, dtype=int),
+        "percent": np.zeros(shape, dtype=int),
+        "max_triggers": -np.ones(shape, dtype=int),
+        "until_end_of_battle": np.zeros(shape, dtype=int),
+    }
+    for sidx,name in enumerate(species_list):
+        fd = data["pets"][name]
+        for level in range(1,4):
+            ability_str = "level{}Ability".format(level)
+            if ability_str not in fd:
+                continue
+            ability = fd[ability_str]
+            trigger = ability["trigger"]
+            if trigger not in battle_triggers:
+                continue
+
+            ### Check if the ability is supported
+            supported = True
+            if trigger not in array_triggers:
+                supported = False
+            elif trigger == "AfterAttack":
+                if ability["triggeredBy"] != {"kind": "FriendAhead", "n": 1}:
+                    supported = False
+            elif ability["triggeredBy"]["kind"] != "Self":
+                supported = False
+            effect = ability["effect"]
+            if effect["kind"] != "ModifyStats":
+                supported = False
+            elif effect["target"] != {"kind": "Self"}:
+                supported = False
+            if not supported:
+                table["kind"][sidx,level] = -1
+                continue
+
+            table["kind"][sidx,level] = array_triggers.index(trigger)
+            if "attackAmount" in effect:
+                table["attack"][sidx,level] = effect["attackAmount"]
+            if "healthAmount" in effect:
+                table["health"][sidx,level] = effect["healthAmount"]
+            if "amount" in effect:
+                table["percent"][sidx,level] = effect["amount"]["attackPercent"]
+            if "maxTriggers" in ability:
+                table["max_triggers"][sidx,level] = ability["maxTriggers"]
+            if effect.get("untilEndOfBattle", False) is True:
+                table["until_end_of_battle"][sidx,level] = 1
+
+    return table
+
+
+ability_table = build_ability_table()
+### Lists are much faster than arrays for indexing single entries
+ability_list = {key: value.tolist() for key,value in ability_table.items()}
+
+
+def check_array_pet(pet):
+    """ Returns True if the Pet can be used in the array battle """
+    if pet.name == "pet-none":
+        return True
+    if pet.override_ability:
+        return False
+    if pet.level not in [1,2,3]:
+        return False
+    if pet.status not in array_statuses:
+        return False
+    if ability_list["kind"][species_idx[pet.name]][pet.level] < 0:
+        return False
+    return True
+
+
+def check_array_team(team):
+    """ Returns True if all Pets in the Team can be used in the array battle """
+    for slot in team:
+        if not check_array_pet(slot.pet):
+            return False
+    return True
+
+
+def team_to_array(team):
+    """
+    Converts the Team to a dictionary of arrays with shape (5,) for each of the
+    fields.
+
+    """
+    values = team_to_list(team)
+    return {key: np.array(value, dtype=int) for key,value in values.items()}
+
+
+def team_to_list(team):
+    """
+    Same as team_to_array but the dictionary contains lists. This is faster
+    when many teams are stacked together.
+    
+    """
+    if not check_array_team(team):
+        raise Exception("Team {} not supported by array battle".format(team))
+    values = {key: [0 for x in range(5)] for key in fields}
+    for iter_idx,slot in enumerate(team):
+        pet = slot.pet
+        if pet.name == "pet-none":
+            continue
+        values["species"][iter_idx] = species_idx[pet.name]
+        values["attack"][iter_idx] = pet._attack
+        values["attack_buff"][iter_idx] = pet._until_end_of_battle_attack_buff
+        values["health"][iter_idx] = pet._health
+        values["health_buff"][iter_idx] = pet._until_end_of_battle_health_buff
+        values["status"][iter_idx] = pet._status
+        values["level"][iter_idx] = pet.level
+        values["hurt"][iter_idx] = pet._hurt
+        values["counter"][iter_idx] = pet.ability_counter
+    return values
+
+
+def teams_to_array(t0, t1):
+    """
+    Converts two teams to a dictionary of arrays with shape (2,5) for each of
+    the fields.
+
+    """
+    a0 = team_to_array(t0)
+    a1 = team_to_array(t1)
+    return {key: np.stack([a0[key],a1[key]]) for key in fields}
+
+
+def array_to_team(state, team_idx):
+    """
+    Converts the arrays of the given team_idx back to a Team. Only the fields
+    that are stored in the arrays are set for the Pets.
+
+    """
+    team = Team()
+    for iter_idx in range(5):
+        sidx = int(state["species"][team_idx][iter_idx])
+        if sidx == 0:
+            continue
+        pet = Pet(species_list[sidx])
+        pet._attack = int(state["attack"][team_idx][iter_idx])
+        pet._until_end_of_battle_attack_buff = int(
+            state["attack_buff"][team_idx][iter_idx])
+        pet._health = int(state["health"][team_idx][iter_idx])
+        pet._until_end_of_battle_health_buff = int(
+            state["health_buff"][team_idx][iter_idx])
+        pet.status = status_list[int(state["status"][team_idx][iter_idx])]
+        pet.level = int(state["level"][team_idx][iter_idx])
+        pet._hurt = int(state["hurt"][team_idx][iter_idx])
+        pet.ability_counter = int(state["counter"][team_idx][iter_idx])
+        team[iter_idx] = pet
+    return team
+
+
+class ArrayBattle():
+    """
+    Performs a battle using arrays for the state of both teams instead of
+    Team, TeamSlot, and Pet objects.
+
+    Each field of the pets (species, attack, health, status...) is stored as
+    a separate array for both teams. Pets without battle abilities, pets with
+    abilities that only modify their own stats (boar, kangaroo, hippo,
+    peacock), and all statuses except honey-bee and extra-life are supported.
+    Use check_array_team to check if a team is supported. The result of the
+    battle is identical to the result from Battle, which can be checked using
+    test_array_battle.
+
+    """
+    def __init__(self, t0, t1):
+        """
+        Converts the input teams t0 and t1 to arrays. The original teams are
+        not modified by the battle.
+
+        """
+        self.state = teams_to_array(t0,t1)
+
+
+    def battle(self, summary=False):
+        """ 
+        Returns 0 for t0 win, 1 for t1 win, 2 for draw. If summary is True, 
+        the BattleSummary of the battle is returned instead.
+        
+        """
+        ### Lists are much faster for the many single entry operations
+        state = {key: value.tolist() for key,value in self.state.items()}
+        result,rounds = array_battle(state)
+        if summary:
+            return array_summary(state, result, rounds)
+        return result
+
+
+def array_battle(state):
+    """
+    Performs the battle in-place for the input state that is a dictionary of
+    lists with shape (2,5). Follows the same phases as Battle. Returns the
+    result and the number of attacks that have been performed.
+
+    """
+    ### Start of battle
+    array_move_forward(state)
+    array_hurt_and_faint(state)
+    array_move_forward(state)
+
+    species = state["species"]
+    rounds = 0
+    while True:
+        ### Check exit condition
+        if species[0][0] == 0 or species[1][0] == 0:
+            break
+        rounds += 1
+
+        array_move_forward(state)
+
+        ### Before attack
+        if array_health(state,0,0) > 0 and array_health(state,1,0) > 0:
+            for team_idx in [0,1]:
+                array_trigger(state, team_idx, 0, 1)
+
+        ### Attack and after attack
+        knockout_list = array_attack(state)
+        if knockout_list != None:
+            for team_idx in [0,1]:
+                array_trigger(state, team_idx, 1, 2)
+        array_hurt_and_faint(state)
+
+        ### Knockout
+        if knockout_list != None:
+            for team_idx in knockout_list:
+                if species[team_idx][0] == 0:
+                    continue
+                if state["health"][team_idx][0] <= 0:
+                    continue
+                array_trigger(state, team_idx, 0, 3)
+
+        array_move_forward(state)
+
+        result = array_battle_result(state)
+        if result >= 0:
+            return result,rounds
+
+    return array_battle_result(state),rounds
+
+
+def array_summary(state, result, rounds):
+    """ Returns the BattleSummary for the state of a finished array battle """
+    survivors = [0,0]
+    attack = [0,0]
+    health = [0,0]
+    for team_idx in [0,1]:
+        for pet_idx in range(5):
+            if state["species"][team_idx][pet_idx] == 0:
+                continue
+            if array_health(state,team_idx,pet_idx) <= 0:
+                continue
+            survivors[team_idx] += 1
+            attack[team_idx] += array_attack_value(state,team_idx,pet_idx)
+            health[team_idx] += array_health(state,team_idx,pet_idx)
+    return BattleSummary(result, rounds, tuple(survivors), tuple(attack),
+                         tuple(health), "result")
+
+
+def array_health(state, team_idx, pet_idx):
+    return min(state["health"][team_idx][pet_idx]
+               +state["health_buff"][team_idx][pet_idx], 50)
+
+
+def array_attack_value(state, team_idx, pet_idx):
+    return min(state["attack"][team_idx][pet_idx]
+               +state["attack_buff"][team_idx][pet_idx], 50)
+
+
+def array_battle_result(state):
+    found = [False, False]
+    for team_idx in [0,1]:
+        for pet_idx in range(5):
+            if state["species"][team_idx][pet_idx] == 0:
+                continue
+            if array_health(state,team_idx,pet_idx) > 0:
+                found[team_idx] = True
+                break
+    if found[0] and found[1]:
+        return -1
+    if found[0]:
+        return 0
+    if found[1]:
+        return 1
+    return 2
+
+
+def array_move_forward(state):
+    """ Moves all pets to the furthest possible forward location """
+    for team_idx in [0,1]:
+        species = state["species"][team_idx]
+        filled_idx = [x for x in range(5) if species[x] != 0]
+        if filled_idx[-1:] == [len(filled_idx)-1]:
+            ### Already moved forward
+            continue
+        empty = [0 for x in range(5-len(filled_idx))]
+        for key in fields:
+            temp_values = state[key][team_idx]
+            state[key][team_idx] = [temp_values[x] for x in filled_idx]+empty
+
+
+def array_remove(state, team_idx, pet_idx):
+    for key in fields:
+        state[key][team_idx][pet_idx] = 0
+
+
+def array_trigger(state, team_idx, pet_idx, kind):
+    """
+    Activates the ability of the pet if the ability is of the given kind.
+    Returns True if activated.
+
+    """
+    sidx = state["species"][team_idx][pet_idx]
+    level = state["level"][team_idx][pet_idx]
+    if ability_list["kind"][sidx][level] != kind:
+        return False
+    if array_triggers[kind] in ["Hurt", "KnockOut"]:
+        ### Cannot activate if health is less than zero because fainted
+        if state["health"][team_idx][pet_idx] <= 0:
+            return False
+    max_triggers = ability_list["max_triggers"][sidx][level]
+    if max_triggers >= 0:
+        if state["counter"][team_idx][pet_idx] >= max_triggers:
+            return False
+        state["counter"][team_idx][pet_idx] += 1
+
+    attack_amount = ability_list["attack"][sidx][level]
+    health_amount = ability_list["health"][sidx][level]
+    percent = ability_list["percent"][sidx][level]
+    if percent != 0:
+        attack_amount = int(
+            array_attack_value(state,team_idx,pet_idx)*percent*0.01)
+    if ability_list["until_end_of_battle"][sidx][level]:
+        state["attack_buff"][team_idx][pet_idx] += attack_amount
+        state["health_buff"][team_idx][pet_idx] += health_amount
+    else:
+        state["attack"][team_idx][pet_idx] += attack_amount
+        state["health"][team_idx][pet_idx] += health_amount
+    state["attack"][team_idx][pet_idx] = min(
+        state["attack"][team_idx][pet_idx], 50)
+    state["health"][team_idx][pet_idx] = min(
+        state["health"][team_idx][pet_idx], 50)
+    return True
+
+
+def array_hurt_and_faint(state):
+    """
+    Removes all fainted pets and then performs the hurt triggers for all pets
+    that were hurt. Fainted pets cannot have any triggers in the array battle
+    so a single iteration is sufficient.
+
+    """
+    species = state["species"]
+    hurt = state["hurt"]
+    for team_idx in [0,1]:
+        for pet_idx in range(5):
+            if species[team_idx][pet_idx] == 0:
+                continue
+            if array_health(state,team_idx,pet_idx) <= 0:
+                array_remove(state,team_idx,pet_idx)
+    for team_idx in [0,1]:
+        for pet_idx in range(5):
+            while hurt[team_idx][pet_idx] > 0:
+                hurt[team_idx][pet_idx] -= 1
+                array_trigger(state, team_idx, pet_idx, 4)
+
+
+weak_id = status_idx["status-weak"]
+coconut_id = status_idx["status-coconut-shield"]
+bone_id = status_idx["status-bone-attack"]
+garlic_id = status_idx["status-garlic-armor"]
+melon_id = status_idx["status-melon-armor"]
+steak_id = status_idx["status-steak-attack"]
+poison_id = status_idx["status-poison-attack"]
+
+
+def array_get_attack(a0, s0, h0, a1, s1, h1):
+    """
+    Same as battle.get_attack for attack a, status s, and health h of the two
+    pets. Returns the attack values and the statuses after the attack.
+
+    """
+    if s0 == garlic_id:
+        a1 = max(a1-2, 1)
+    if s1 == garlic_id:
+        a0 = max(a0-2, 1)
+    if s0 == melon_id:
+        a1 = max(a1-20, 0)
+        s0 = none_id
+    if s1 == melon_id:
+        a0 = max(a0-20, 0)
+        s1 = none_id
+    if s0 == bone_id:
+        a0 = a0+5
+    if s1 == bone_id:
+        a1 = a1+5
+    if s0 == steak_id:
+        a0 = a0+20
+        s0 = none_id
+    if s1 == steak_id:
+        a1 = a1+20
+        s1 = none_id
+    if s0 == weak_id:
+        a1 = a1+3
+    if s1 == weak_id:
+        a0 = a0+3
+    if s0 == coconut_id:
+        a1 = 0
+        s0 = none_id
+    if s1 == coconut_id:
+        a0 = 0
+        s1 = none_id
+    if s0 == poison_id:
+        if a0 > 0:
+            a0 = h1
+    if s1 == poison_id:
+        if a1 > 0:
+            a1 = h0
+    return a0,s0,a1,s1
+
+
+def array_attack(state):
+    """
+    Performs the attack between the first pets of each team, including splash
+    damage. Returns the list of team indices of the pets that knocked out an
+    enemy or None if no attack was performed.
+
+    """
+    species = state["species"]
+    status = state["status"]
+    if species[0][0] == 0 or species[1][0] == 0:
+        return None
+    if array_health(state,0,0) <= 0 or array_health(state,1,0) <= 0:
+        return None
+
+    ### Get next pets before the attack for splash
+    next_idx = [-1,-1]
+    for team_idx in [0,1]:
+        for pet_idx in range(1,5):
+            if species[team_idx][pet_idx] == 0:
+                continue
+            if array_health(state,team_idx,pet_idx) > 0:
+                next_idx[team_idx] = pet_idx
+                break
+
+    a0,s0,a1,s1 = array_get_attack(
+        array_attack_value(state,0,0), status[0][0], array_health(state,0,0),
+        array_attack_value(state,1,0), status[1][0], array_health(state,1,0))
+    status[0][0] = s0
+    status[1][0] = s1
+    array_hurt(state,0,0,a1)
+    array_hurt(state,1,0,a0)
+
+    knockout_list = []
+    if array_health(state,0,0) <= 0:
+        knockout_list.append(1)
+    if array_health(state,1,0) <= 0:
+        knockout_list.append(0)
+
+    ### Splash attack is performed with attack of 5. The status of the
+    ###   attacking pet is always restored afterwards.
+    for team_idx in [0,1]:
+        if status[team_idx][0] != splash_id:
+            continue
+        other_idx = 1-team_idx
+        pet_idx = next_idx[other_idx]
+        if pet_idx < 0:
+            continue
+        values = [(5, splash_id, array_health(state,team_idx,0)),
+                  (array_attack_value(state,other_idx,pet_idx),
+                   status[other_idx][pet_idx],
+                   array_health(state,other_idx,pet_idx))]
+        if team_idx == 1:
+            values = values[::-1]
+        a0,s0,a1,s1 = array_get_attack(*values[0], *values[1])
+        if team_idx == 0:
+            status[1][pet_idx] = s1
+            array_hurt(state,1,pet_idx,a0)
+        else:
+            status[0][pet_idx] = s0
+            array_hurt(state,0,pet_idx,a1)
+        if array_health(state,other_idx,pet_idx) <= 0:
+            knockout_list.append(team_idx)
+
+    return knockout_list
+
+
+def array_hurt(state, team_idx, pet_idx, value):
+    state["health"][team_idx][pet_idx] -= value
+    state["hurt"][team_idx][pet_idx] += 1
+
+
+def battle_many(pairs, fallback=True, cache=None, rng=None, summary=False):
+    """
+    Performs the battles for all (t0,t1) pairs at once. The states of the 
+    supported pairs are stacked into arrays with shape (N,2,5) and all battles
+    are advanced together, one attack at a time. Battles are masked out as 
+    soon as they are finished. 
+    
+    Pairs that cannot be performed by the array battle are performed one at a
+    time with Battle if fallback is True. Otherwise, an Exception is raised. 
+    
+    If a BattleCache is provided, the results of pairs found in the cache are
+    drawn from the cache. The results of the array battles are deterministic
+    and are stored in the cache. Pairs that are performed with Battle use 
+    BattleCache.battle such that the probabilities of random battles are 
+    stored. 
+    
+    If rng is provided, a single Generator is used for all battles that are
+    performed with Battle such that the results are reproducible. 
+    
+    Returns an array with the result of each pair: 0 for t0 win, 1 for t1 win, 
+    2 for draw. If summary is True, a structured array with summary_dtype is
+    returned instead, holding the fields of the BattleSummary of each pair. 
+    The end_rule is stored as its integer code from end_rule_codes. 
+    The cache only stores results, therefore, the cache is not used to look
+    up pairs if summary is True. 
+    
+    """
+    if rng is not None:
+        rng = np.random.default_rng(rng)
+    if summary:
+        summaries = np.zeros((len(pairs),), dtype=summary_dtype)
+        ### View of the results field of the summaries
+        results = summaries["result"]
+        results[:] = -1
+    else:
+        results = -np.ones((len(pairs),), dtype=int)
+    array_idx = []
+    values = {key: [] for key in fields}
+    for iter_idx,(t0,t1) in enumerate(pairs):
+        if check_array_team(t0) and check_array_team(t1):
+            if cache is not None and not summary:
+                probs = cache.get(t0,t1)
+                if probs is not None:
+                    results[iter_idx] = cache.sample(probs)
+                    continue
+            array_idx.append(iter_idx)
+            v0 = team_to_list(t0)
+            v1 = team_to_list(t1)
+            for key in fields:
+                values[key].append([v0[key],v1[key]])
+        elif fallback:
+            if summary:
+                battle_summary = Battle(t0,t1,history=False,
+                                        rng=rng).battle(summary=True)
+                end_rule = end_rule_codes[battle_summary.end_rule]
+                summaries[iter_idx] = tuple(battle_summary[:-1])+(end_rule,)
+            elif cache is not None:
+                results[iter_idx] = cache.battle(t0,t1)
+            else:
+                results[iter_idx] = Battle(t0,t1,history=False,
+                                           rng=rng).battle()
+        else:
+            raise Exception("Teams \n{}\n{}\nnot supported by array battle"
+                            .format(t0,t1))
+    
+    if len(array_idx) > 0:
+        state = {key: np.array(value, dtype=int) 
+                 for key,value in values.items()}
+        if summary:
+            summaries[array_idx] = array_battle_many(state, summary=True)
+        else:
+            results[array_idx] = array_battle_many(state)
+        if cache is not None:
+            for iter_idx in array_idx:
+                t0,t1 = pairs[iter_idx]
+                cache.put(t0,t1,np.eye(3)[results[iter_idx]])
+    
+    if summary:
+        return summaries
+    return results
+
+
+def array_battle_many(state, summary=False):
+    """
+    Performs all battles in the input state that is a dictionary of arrays 
+    with shape (N,2,5). Follows the same phases as array_battle. Returns the
+    results, or the structured array with summary_dtype if summary is True.
+    
+    """
+    summaries = np.zeros((len(state["species"]),), dtype=summary_dtype)
+    results = summaries["result"]
+    results[:] = -1
+    rounds = summaries["rounds"]
+    
+    ### Start of battle
+    many_move_forward(state)
+    many_hurt_and_faint(state)
+    many_move_forward(state)
+    
+    battle_idx = np.arange(0,len(results))
+    while len(battle_idx) > 0:
+        ### Mask out finished battles. All pets have been moved forward, 
+        ###   therefore, the battle is finished if a first slot is empty.
+        done = np.logical_or(state["species"][:,0,0] == 0, 
+                             state["species"][:,1,0] == 0)
+        if np.any(done):
+            alive = np.logical_and(state["species"] != 0, 
+                                   many_health(state) > 0).any(axis=-1)
+            done_results = np.full((len(done),), 2)
+            done_results[alive[:,1]] = 1
+            done_results[alive[:,0]] = 0
+            results[battle_idx[done]] = done_results[done]
+            if summary:
+                survive = np.logical_and(state["species"][done] != 0,
+                                         many_health(state)[done] > 0)
+                done_idx = battle_idx[done]
+                summaries["survivors"][done_idx] = survive.sum(axis=-1)
+                summaries["attack"][done_idx] = np.sum(
+                    many_attack_value(state)[done]*survive, axis=-1)
+                summaries["health"][done_idx] = np.sum(
+                    many_health(state)[done]*survive, axis=-1)
+                ### Array battles only end by a result
+                summaries["end_rule"][done_idx] = end_rule_codes["result"]
+            keep = np.logical_not(done)
+            battle_idx = battle_idx[keep]
+            state = {key: value[keep] for key,value in state.items()}
+            if len(battle_idx) == 0:
+                break
+        rounds[battle_idx] += 1
+        
+        ### Before attack for the first pets
+        front_mask = np.zeros(state["species"].shape, dtype=bool)
+        front_mask[:,:,0] = True
+        many_trigger(state, front_mask, 1)
+        
+        ### Attack, then after attack for the pets behind the first pets
+        knockout_count = many_attack(state)
+        behind_mask = np.zeros(state["species"].shape, dtype=bool)
+        behind_mask[:,:,1] = True
+        many_trigger(state, behind_mask, 2)
+        many_hurt_and_faint(state)
+        
+        ### Knockout is activated once for every knockout
+        for iter_idx in range(int(knockout_count.max(initial=0))):
+            knockout_mask = np.zeros(state["species"].shape, dtype=bool)
+            knockout_mask[:,:,0] = knockout_count > iter_idx
+            knockout_mask[:,:,0] &= state["species"][:,:,0] != 0
+            many_trigger(state, knockout_mask, 3)
+        
+        many_move_forward(state)
+    
+    if summary:
+        return summaries
+    return results
+
+
+def many_health(state):
+    return np.minimum(state["health"]+state["health_buff"], 50)
+
+
+def many_attack_value(state):
+    return np.minimum(state["attack"]+state["attack_buff"], 50)
+
+
+def many_move_forward(state):
+    """ Moves all pets to the furthest possible forward location """
+    empty = state["species"] == 0
+    sort_idx = np.argsort(empty, axis=-1, kind="stable")
+    for key in fields:
+        state[key] = np.take_along_axis(state[key], sort_idx, axis=-1)
+
+
+def many_trigger(state, mask, kind):
+    """
+    Activates the abilities of the given kind for all pets in the mask. 
+    
+    """
+    species = state["species"]
+    level = state["level"]
+    mask = np.logical_and(mask, ability_table["kind"][species,level] == kind)
+    if not np.any(mask):
+        return
+    if array_triggers[kind] in ["Hurt", "KnockOut"]:
+        ### Cannot activate if health is less than zero because fainted
+        mask &= state["health"] > 0
+    max_triggers = ability_table["max_triggers"][species,level]
+    limited = np.logical_and(mask, max_triggers >= 0)
+    mask &= np.logical_not(np.logical_and(limited, 
+                                          state["counter"] >= max_triggers))
+    limited &= mask
+    state["counter"] += limited
+    
+    attack_amount = ability_table["attack"][species,level]
+    health_amount = ability_table["health"][species,level]
+    percent = ability_table["percent"][species,level]
+    percent_amount = (many_attack_value(state)*percent*0.01).astype(int)
+    attack_amount = np.where(percent != 0, percent_amount, attack_amount)
+    attack_amount = np.where(mask, attack_amount, 0)
+    health_amount = np.where(mask, health_amount, 0)
+    buff = ability_table["until_end_of_battle"][species,level] == 1
+    state["attack_buff"] += np.where(buff, attack_amount, 0)
+    state["health_buff"] += np.where(buff, health_amount, 0)
+    state["attack"] += np.where(buff, 0, attack_amount)
+    state["health"] += np.where(buff, 0, health_amount)
+    state["attack"] = np.where(mask, np.minimum(state["attack"],50), 
+                               state["attack"])
+    state["health"] = np.where(mask, np.minimum(state["health"],50), 
+                               state["health"])
+
+
+def many_hurt_and_faint(state):
+    """
+    Removes all fainted pets and then performs the hurt triggers for all pets
+    that were hurt. 
+    
+    """
+    fainted = np.logical_and(state["species"] != 0, many_health(state) <= 0)
+    for key in fields:
+        state[key][fainted] = 0
+    while True:
+        hurt = state["hurt"] > 0
+        if not np.any(hurt):
+            break
+        state["hurt"] -= hurt
+        many_trigger(state, hurt, 4)
+
+
+def many_get_attack(a0, s0, h0, a1, s1, h1):
+    """
+    Same as array_get_attack for arrays of attack a, status s, and health h. 
+    Returns the attack values and the statuses after the attack.
+    
+    """
+    a1 = np.where(s0 == garlic_id, np.maximum(a1-2, 1), a1)
+    a0 = np.where(s1 == garlic_id, np.maximum(a0-2, 1), a0)
+    a1 = np.where(s0 == melon_id, np.maximum(a1-20, 0), a1)
+    s0 = np.where(s0 == melon_id, none_id, s0)
+    a0 = np.where(s1 == melon_id, np.maximum(a0-20, 0), a0)
+    s1 = np.where(s1 == melon_id, none_id, s1)
+    a0 = np.where(s0 == bone_id, a0+5, a0)
+    a1 = np.where(s1 == bone_id, a1+5, a1)
+    a0 = np.where(s0 == steak_id, a0+20, a0)
+    s0 = np.where(s0 == steak_id, none_id, s0)
+    a1 = np.where(s1 == steak_id, a1+20, a1)
+    s1 = np.where(s1 == steak_id, none_id, s1)
+    a1 = np.where(s0 == weak_id, a1+3, a1)
+    a0 = np.where(s1 == weak_id, a0+3, a0)
+    a1 = np.where(s0 == coconut_id, 0, a1)
+    s0 = np.where(s0 == coconut_id, none_id, s0)
+    a0 = np.where(s1 == coconut_id, 0, a0)
+    s1 = np.where(s1 == coconut_id, none_id, s1)
+    a0 = np.where(np.logical_and(s0 == poison_id, a0 > 0), h1, a0)
+    a1 = np.where(np.logical_and(s1 == poison_id, a1 > 0), h0, a1)
+    return a0,s0,a1,s1
+
+
+def many_attack(state):
+    """
+    Performs the attack between the first pets of each team for all battles, 
+    including splash damage. Every battle must have two first pets. Returns 
+    the number of knockouts for each team with shape (N,2).
+    
+    """
+    rows = np.arange(0,len(state["species"]))
+    health = many_health(state)
+    attack = many_attack_value(state)
+    status = state["status"]
+    
+    ### Get next pets before the attack for splash
+    available = np.logical_and(state["species"][:,:,1:] != 0, 
+                               health[:,:,1:] > 0)
+    next_found = available.any(axis=-1)
+    next_idx = np.argmax(available, axis=-1)+1
+    
+    a0,s0,a1,s1 = many_get_attack(attack[:,0,0], status[:,0,0], health[:,0,0],
+                                  attack[:,1,0], status[:,1,0], health[:,1,0])
+    status[:,0,0] = s0
+    status[:,1,0] = s1
+    state["health"][:,0,0] -= a1
+    state["health"][:,1,0] -= a0
+    state["hurt"][:,:,0] += 1
+    
+    health = many_health(state)
+    knockout_count = np.zeros((len(rows),2), dtype=int)
+    knockout_count[:,1] += health[:,0,0] <= 0
+    knockout_count[:,0] += health[:,1,0] <= 0
+    
+    ### Splash attack is performed with attack of 5. The status of the 
+    ###   attacking pet is always restored afterwards.
+    for team_idx in [0,1]:
+        other_idx = 1-team_idx
+        splash = np.logical_and(status[:,team_idx,0] == splash_id, 
+                                next_found[:,other_idx])
+        if not np.any(splash):
+            continue
+        splash_rows = rows[splash]
+        pet_idx = next_idx[splash,other_idx]
+        values = [(np.full((len(splash_rows),), 5), 
+                   np.full((len(splash_rows),), splash_id), 
+                   health[splash_rows,team_idx,0]), 
+                  (attack[splash_rows,other_idx,pet_idx],
+                   status[splash_rows,other_idx,pet_idx],
+                   health[splash_rows,other_idx,pet_idx])]
+        if team_idx == 1:
+            values = values[::-1]
+        a0,s0,a1,s1 = many_get_attack(*values[0], *values[1])
+        if team_idx == 0:
+            status[splash_rows,1,pet_idx] = s1
+            damage = a0
+        else:
+            status[splash_rows,0,pet_idx] = s0
+            damage = a1
+        state["health"][splash_rows,other_idx,pet_idx] -= damage
+        state["hurt"][splash_rows,other_idx,pet_idx] += 1
+        splash_health = many_health(state)[splash_rows,other_idx,pet_idx]
+        knockout_count[splash_rows,team_idx] += splash_health <= 0
+    
+    return knockout_count
+
+
+def random_array_team(rs=None, max_stat=12):
+    """
+    Builds random Team that is supported by the array battle. Used for testing
+    the array battle against Battle.
+
+    """
+    if rs == None:
+        rs = np.random
+    names = []
+    for name,fd in data["pets"].items():
+        if name == "pet-none":
+            continue
+        if "StandardPack" not in fd["packs"]:
+            continue
+        if min(ability_list["kind"][species_idx[name]]) < 0:
+            continue
+        names.append(name)
+    pets = []
+    for iter_idx in range(rs.randint(1,6)):
+        pet = Pet(names[rs.randint(0,len(names))])
+        pet._attack = int(rs.randint(1,max_stat+1))
+        pet._health = int(rs.randint(1,max_stat+1))
+        pet.level = int(rs.randint(1,4))
+        if rs.uniform() < 0.5:
+            pet.status = array_statuses[rs.randint(0,len(array_statuses))]
+        pets.append(pet)
+    return Team(pets)
+
+
+def test_array_battle(pairs=None, n=1000, seed=0, verbose=True):
+    """
+    Test mode for the array battle. Performs the battles for the list of
+    (t0,t1) pairs using Battle, ArrayBattle, and battle_many and raises an 
+    Exception if any of the results are different. If no pairs are provided, then n random
+    pairs of supported teams are used.
+
+    Returns the results and the time for Battle and ArrayBattle.
+
+    """
+    if pairs == None:
+        rs = np.random.RandomState(seed)
+        pairs = [(random_array_team(rs),random_array_team(rs))
+                 for x in range(n)]
+
+    start = time.time()
+    battle_results = [Battle(t0,t1,history=False).battle() for t0,t1 in pairs]
+    battle_time = time.time()-start
+
+    start = time.time()
+    array_results = [ArrayBattle(t0,t1).battle() for t0,t1 in pairs]
+    array_time = time.time()-start
+    
+    start = time.time()
+    many_results = battle_many(pairs, fallback=False)
+    many_time = time.time()-start
+
+    for iter_idx,(t0,t1) in enumerate(pairs):
+        if battle_results[iter_idx] != array_results[iter_idx]:
+            raise Exception("Array battle result {} does not match Battle "
+                            "result {} for teams \n{}\n{}".format(
+                                array_results[iter_idx],
+                                battle_results[iter_idx],t0,t1))
+        if battle_results[iter_idx] != many_results[iter_idx]:
+            raise Exception("battle_many result {} does not match Battle "
+                            "result {} for teams \n{}\n{}".format(
+                                many_results[iter_idx],
+                                battle_results[iter_idx],t0,t1))
+
+    if verbose:
+        print("{} battles with identical results".format(len(pairs)))
+        print("Battle:      {:.1f} battles/sec".format(len(pairs)/battle_time))
+        print("ArrayBattle: {:.1f} battles/sec".format(len(pairs)/array_time))
+        print("battle_many: {:.1f} battles/sec".format(len(pairs)/many_time))
+
+    return array_results,battle_time,array_time
+
+
+# %%
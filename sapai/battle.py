@@ -1,12 +1,75 @@
 
 import copy
+from collections import namedtuple
 import numpy as np
 
 from sapai.data import data
 from sapai.pets import Pet
 from sapai.teams import Team
+from sapai.rand import MockRandomState,BranchRandomState,\
+                        GeneratorRandomState,distinct_orders
 from sapai.effects import get_effect_function,get_pet,get_teams,\
                             RespawnPet,SummonPet,SummonRandomPet
+from sapai.history import pet_snapshot,team_snapshot,targets_snapshot,\
+                          format_history
+from sapai.statuses import get_damage,none_id,splash_id,\
+                            status_consumed_defend,\
+                            status_consumed_attack
+
+
+### Phases performed at the start of the battle and during every attack
+start_phases = ("phase_move_start",
+                "phase_start",
+                "phase_hurt_and_faint",
+                "phase_move_end")
+attack_phases = ("phase_move_start",
+                 "phase_attack_before",
+                 "phase_hurt_and_faint_ab",
+                 "phase_attack",
+                 "phase_attack_after",
+                 "phase_hurt_and_faint_aa",
+                 "phase_knockout",
+                 "phase_hurt_and_faint_k",
+                 "phase_move_end")
+
+### Triggers of abilities that are activated during the battle
+battle_triggers = ("StartOfBattle",
+                   "BeforeAttack",
+                   "AfterAttack",
+                   "KnockOut",
+                   "Faint",
+                   "Hurt",
+                   "Summoned")
+
+### Statuses that give the pet an ability when it faints
+faint_statuses = ("status-honey-bee", "status-extra-life")
+
+### Trigger that is required for something to happen in the phase. Before 
+###   the attack, pets can only faint or be hurt due to BeforeAttack abilities.
+phase_triggers = {"phase_attack_before": "BeforeAttack",
+                  "phase_hurt_and_faint_ab": "BeforeAttack",
+                  "phase_attack_after": "AfterAttack",
+                  "phase_knockout": "KnockOut"}
+
+### Summary of a finished battle. survivors, attack, and health are given for
+###   (t0,t1) as the number of pets with health above zero and the total 
+###   attack and health of these pets. rounds is the number of attacks. 
+BattleSummary = namedtuple("BattleSummary", 
+                           ["result", "rounds", "survivors", "attack", 
+                            "health", "end_rule"])
+### Integer codes of the end_rule that are stored in summary_dtype
+end_rule_codes = {"result": 0, "max_rounds": 1, "stalemate": 2}
+### Structured array of the summaries of many battles, see battle_many
+summary_dtype = np.dtype([("result", int),
+                          ("rounds", int),
+                          ("survivors", int, (2,)),
+                          ("attack", int, (2,)),
+                          ("health", int, (2,)),
+                          ("end_rule", int)])
+
+### Phase lists used when history is not stored. A None phase list tells the 
+###   phase functions to skip building the entries of the battle_history.
+no_history_phase_dict = dict.fromkeys(start_phases+attack_phases)
 
 
 class Battle():
@@ -43,12 +106,65 @@ class Battle():
                     5.5.1 if knock-out ability activated jump to 5.5
             5.6. if battle has not ended, jump to 5.0
     
+    If only the result of the battle is required, history=False should be 
+    used. Then, the battle_history is not built at all. The outcome of the 
+    battle is identical in either case. The battle_history stores compact 
+    snapshots of the pets for each event, see sapai.history. Human-readable
+    strings are only built by history_str. 
+    
+    By default, random choices are made by the random state of each pet and 
+    ties of the pet priority are broken using the global numpy random state. 
+    If rng is provided, all random choices of the battle are made by a 
+    single numpy Generator instead such that the battle is reproducible 
+    without the cost of a RandomState for every pet. Independent Generators
+    for parallel workers can be created with sapai.rand.spawn_rngs. 
+    
+    Battles that cannot end, for example because neither team can deal 
+    damage, are ended as a draw when a battle state repeats or when 
+    max_rounds attacks have been performed. The rule that ended the battle is
+    stored in end_rule. 
+    
     """
-    def __init__(self, t0, t1):
+    def __init__(self, t0, t1, history=True, debug=False, rng=None,
+                 max_rounds=500, stalemate=True):
         """
         Performs the battle between the input teams t1 and t2. 
         
+        Arguments
+        ---------
+        t0: Team
+            First team
+        t1: Team
+            Second team
+        history: bool
+            If True, the battle_history is stored for every phase of the 
+            battle. This is required for graph_battle. 
+        debug: bool
+            If True, sanity checks are performed on the pet priority every 
+            time it is sorted
+        rng: int, SeedSequence, or Generator
+            If provided, a single Generator created by np.random.default_rng
+            is used for all random choices of the battle
+        max_rounds: int
+            Maximum number of attacks after which the battle ends as a draw.
+            No maximum is used if None. 
+        stalemate: bool
+            If True, the battle ends as a draw when the battle state after an 
+            attack is identical to the state after a previous attack
+        
         """
+        self.history = history
+        self.debug = debug
+        self.max_rounds = max_rounds
+        self.stalemate = stalemate
+        
+        ### Rule that has ended the battle, which is one of None if the battle
+        ###   has not ended, "result", "max_rounds", or "stalemate"
+        self.end_rule = None
+        self.states = set()
+        ### Number of attacks that have been performed
+        self.rounds = 0
+        
         ### Make copy each team to cary out the battle so that the original
         ### pets are not modified in any way after the battle
         self.t0 = t0.copy()
@@ -56,35 +172,133 @@ class Battle():
         self.t1 = t1.copy()
         self.t1._battle = True
         
+        ### Random state used by all pets of the battle. Summoned pets use the
+        ###   random state of the pet that summoned them. 
+        if rng is not None:
+            self.rng = GeneratorRandomState(rng)
+            for team in [self.t0, self.t1]:
+                for slot in team:
+                    if slot.empty:
+                        continue
+                    slot.pet.rs = self.rng
+        else:
+            self.rng = None
+        
         ### Internal storage
         self.pet_priority = []
         self.battle_history = {}
         
+        ### Pets that attacked and pets that knocked out an enemy during the 
+        ###   current attack phase
+        self.attack_idx = ()
+        self.knockout_list = []
+        
         ### Build initial effect queue order
-        self.pet_priority = self.update_pet_priority(self.t0, self.t1)
+        self.priority = PetPriority(self.t0, self.t1, rs=self.rng, debug=debug)
+        self.pet_priority = self.priority.order
     
     
-    def battle(self):
+    def battle(self, history=None, summary=False):
+        """
+        Performs the battle. Returns 0 for t0 win, 1 for t1 win, 2 for draw.
+        
+        history may be provided to override the history setting of the Battle
+        for this call. If summary is True, the BattleSummary of the battle is
+        returned instead of only the result. 
+        
+        """
+        if history is not None:
+            self.history = history
+            
         ### Perform all effects that occur at the start of the battle
         self.start()
         
         battle_iter = 0
         while True:
             ### First update effect order
-            self.pet_priority = self.update_pet_priority(self.t0, self.t1)
+            self.pet_priority = self.priority.update()
             ### Then attack
             result = self.attack(battle_iter)
             battle_iter += 1
             if result == False:
+                self.end_rule = "result"
+                break
+            if self.check_cutoff(battle_iter):
                 break
         
+        if summary:
+            return self.summary()
         ### Check winner and return 0 for t0 win, 1 for t1 win, 2 for draw
         return self.check_battle_result()
+    
+    
+    def summary(self):
+        """
+        Returns the BattleSummary of the current state of the battle
         
+        """
+        survivors = [0,0]
+        attack = [0,0]
+        health = [0,0]
+        for team_idx,team in enumerate([self.t0, self.t1]):
+            for slot in team:
+                p = slot._pet
+                if p.name == "pet-none":
+                    continue
+                if p.health <= 0:
+                    continue
+                survivors[team_idx] += 1
+                attack[team_idx] += p.attack
+                health[team_idx] += p.health
+        return BattleSummary(self.check_battle_result(),
+                             self.rounds,
+                             tuple(survivors),
+                             tuple(attack),
+                             tuple(health),
+                             self.end_rule)
+    
+    
+    def iter_events(self):
+        """
+        Performs the battle and yields the events as (turn_name, phase, entry)
+        instead of storing them in the battle_history. The turn names and 
+        entries are the same as the keys and entries of the battle_history, 
+        see sapai.history, and the first event is the init entry with the 
+        phase None. Events of a turn, which is the start of the battle or one
+        attack, are yielded as soon as the turn has been performed. 
+        
+        The battle may be stopped early by no longer iterating. If the 
+        battle is completed, the result of the battle is the return value of the
+        generator and is also available from check_battle_result. 
+        
+        """
+        yield ("init", None, [team_snapshot(self.t0), team_snapshot(self.t1)])
+        
+        phase_dict = {x: [] for x in start_phases}
+        self.start(phase_dict)
+        yield from iter_phase_events("start", phase_dict)
+        
+        battle_iter = 0
+        while True:
+            self.pet_priority = self.priority.update()
+            phase_dict = {x: [] for x in attack_phases}
+            result = self.attack(battle_iter, phase_dict)
+            yield from iter_phase_events("attack {}".format(battle_iter), 
+                                         phase_dict)
+            battle_iter += 1
+            if result == False:
+                self.end_rule = "result"
+                break
+            if self.check_cutoff(battle_iter):
+                break
         
-    def start(self):
+        return self.check_battle_result()
+        
+        
+    def start(self, phase_dict=None):
         """ 
-        Perform all start of battle effects 
+        Perform all start of battle effects. If phase_dict is provided, the 
+        events are stored in phase_dict instead of the battle_history.
         
         """
         ### First move the teams forward
@@ -93,34 +307,36 @@ class Battle():
         teams = [t0, t1]
         
         ### Phase of start
-        phase_dict = {
-                      "init": [[str(x) for x in t0], [str(x) for x in t1]],
-                      "start": {
-                      "phase_move_start": [],
-                      "phase_start": [],
-                      "phase_hurt_and_faint": [],
-                      "phase_move_end": []}}
-        
-        for temp_phase in phase_dict["start"]:
+        if phase_dict is not None:
+            pass
+        elif self.history:
+            phase_dict = {x: [] for x in start_phases}
+            self.battle_history["init"] = [team_snapshot(t0),
+                                           team_snapshot(t1)]
+            self.battle_history["start"] = phase_dict
+        else:
+            phase_dict = no_history_phase_dict
+
+        for temp_phase in start_phases:
             battle_phase(self,
-                        temp_phase, 
-                        teams, 
+                        temp_phase,
+                        teams,
                         self.pet_priority,
-                        phase_dict["start"])
-            
-            self.battle_history.update(phase_dict)
+                        phase_dict)
             
             ### If animals have moved or fainted then effect order must be updated
             if temp_phase.startswith("phase_move"):
-                self.pet_priority = self.update_pet_priority(t0, t1)
+                self.pet_priority = self.priority.update()
         
     
-    def attack(self, battle_iter):
+    def attack(self, battle_iter, phase_dict=None):
         """ 
         Perform and attack and then check for new pet triggers 
         
         Returns whether or not another attack should occur. This depends on 
-        if all animals of one team have a health of 0 already. 
+        if all animals of one team have a health of 0 already. If phase_dict
+        is provided, the events are stored in phase_dict instead of the 
+        battle_history.
         
         Order of operations for an attack are:
             - Pets in the front of each team attack
@@ -133,20 +349,6 @@ class Battle():
         t0 = self.t0
         t1 = self.t1
         
-        attack_str = "attack {}".format(battle_iter)
-        phase_dict = {
-            attack_str: {
-            "phase_move_start": [],
-            "phase_attack_before": [],
-            "phase_hurt_and_faint_ab": [],
-            "phase_attack": [],
-            "phase_attack_after": [],
-            "phase_hurt_and_faint_aa": [],
-            "phase_knockout": [],
-            "phase_hurt_and_faint_k": [],
-            "phase_move_end": []}}
-        
-        
         ### Check exit condition, if one team has no animals, return False
         found0 = False
         for temp_slot in t0:
@@ -162,21 +364,38 @@ class Battle():
             return False
         if found1 == False:
             return False
+        self.rounds += 1
+        
+        if phase_dict is not None:
+            pass
+        elif self.history:
+            attack_str = "attack {}".format(battle_iter)
+            phase_dict = {x: [] for x in attack_phases}
+            self.battle_history[attack_str] = phase_dict
+        else:
+            phase_dict = no_history_phase_dict
         
         teams = [t0, t1]
-        for temp_phase in phase_dict[attack_str]:
+        for temp_phase in attack_phases:
             if temp_phase == "phase_hurt_and_faint_k":
                 ### This is checked in phase_knockout for recursive Rhino behavior
                 continue
             
+            if not self.check_phase(temp_phase):
+                ### Nothing can happen in this phase, which is equivalent to 
+                ###   a phase_hurt_and_faint where nothing has fainted
+                if temp_phase.startswith("phase_hurt_and_faint"):
+                    self.pet_priority = self.priority.update()
+                elif temp_phase == "phase_knockout":
+                    self.knockout_list = []
+                continue
+            
             battle_phase(
                         self,
                         temp_phase, 
                         teams, 
                         self.pet_priority,
-                        phase_dict[attack_str])
-
-            self.battle_history.update(phase_dict)
+                        phase_dict)
 
         ### Check if battle is over
         status = self.check_battle_result()
@@ -187,6 +406,74 @@ class Battle():
             return False
 
     
+    def history_str(self):
+        """ Returns the battle_history with the strings of all pets """
+        return format_history(self.battle_history)
+    
+    
+    def check_phase(self, phase):
+        """
+        Returns False if the phase is a no-op because no pet on either team 
+        has an ability with the trigger of the phase. This is checked right 
+        before every phase using the trigger index of the PetPriority, such 
+        that the mask is updated whenever pets are summoned or abilities are 
+        changed. Phases that depend on the attack are always performed.
+        
+        """
+        trigger = phase_triggers.get(phase, None)
+        if trigger is None:
+            return True
+        return len(self.priority.trigger_slots[trigger]) > 0
+    
+    
+    def check_cutoff(self, nrounds):
+        """
+        Checks if the battle should be ended as a draw after nrounds attacks,
+        either because max_rounds has been reached or because of a stalemate.
+        A stalemate is detected when the state_key is identical to the 
+        state_key after a previous attack, such as when neither team can deal
+        damage. The rule is stored in end_rule. 
+        
+        """
+        if self.max_rounds is not None and nrounds >= self.max_rounds:
+            self.end_rule = "max_rounds"
+            return True
+        if self.stalemate:
+            key = self.state_key()
+            if key in self.states:
+                self.end_rule = "stalemate"
+                return True
+            self.states.add(key)
+        return False
+    
+    
+    def state_key(self):
+        """
+        Key that is identical for battles that will have identical outcomes
+        
+        """
+        ### Order of previous ties may change the order of effects
+        key = [tuple(self.priority.sort_idx), 
+               tuple(self.priority.attack), 
+               tuple(self.priority.health)]
+        for team in [self.t0, self.t1]:
+            for slot in team:
+                p = slot.pet
+                if p.name == "pet-none":
+                    key.append(None)
+                    continue
+                if p.override_ability:
+                    ability_key = str(p.override_ability_dict)
+                else:
+                    ability_key = ""
+                key.append((p.name, p._attack, p._health, 
+                            p._until_end_of_battle_attack_buff,
+                            p._until_end_of_battle_health_buff,
+                            p.status, p.level, p._hurt, p.ability_counter,
+                            ability_key))
+        return tuple(key)
+    
+    
     def check_battle_result(self):
         t0 = self.t0
         t1 = self.t1
@@ -203,6 +490,9 @@ class Battle():
                     found1 = True
                     break
         if found0 and found1:
+            if self.end_rule is not None:
+                ### Ended as a draw by check_cutoff
+                return 2
             ### Fight not over
             return -1
         if found0:
@@ -222,102 +512,261 @@ class Battle():
         
         Note that effects are performed in the order of highest attack to lowest
         attack. If there is a tie, then health values are compared. If there is  
-        a tie then a random animal is chosen first. 
-        
-        """
-        ### Build all data types to determine effect order
-        pets = [x for x in t0] + [x for x in t1]
-        attack = [x.attack for x in t0] + [x.attack for x in t1]
-        health = [x.health for x in t0] + [x.health for x in t1]
-        teams = [0 for x in t0] + [1 for x in t1]
-        idx = [x for x in range(5)] + [x for x in range(5)]
-        
-        for iter_idx,value in enumerate(attack):
-            if value == "none":
-                attack[iter_idx] = 0
-                health[iter_idx] = 0
-
-        ### Basic sorting by max attack
-        # sort_idx = np.argsort(attack)[::-1]
-        # attack = np.array([attack[x] for x in sort_idx])
-        # health = np.array([health[x] for x in sort_idx])
-        # teams = np.array([teams[x] for x in sort_idx])
-        # idx = np.array([idx[x] for x in sort_idx])
-        sort_idx = np.arange(0,len(attack))
-        attack = np.array(attack)
-        health = np.array(attack)
-        teams = np.array(teams)
-        idx = np.array(idx)
-                
-        ### Find attack collisions
-        uniquea = np.unique(attack)[::-1]
-        start_idx = 0
-        for uattack in uniquea:
-            ### Get collision idx
-            temp_idx = np.where(attack == uattack)[0]
-            temp_attack = attack[temp_idx]
-            
-            ### Initialize final idx for sorting
-            temp_sort_idx = np.arange(0,len(temp_idx))
-            
-            if len(temp_idx) < 2:
-                end_idx = start_idx + len(temp_idx)
-                sort_idx[start_idx:end_idx] = temp_idx
-                start_idx = end_idx
-                continue
-            
-            ### Correct attack collisions by adding in health
-            temp_health = health[temp_idx]
-            temp_stats =  temp_attack + temp_health
-            temp_start_idx = 0
-            for ustats in np.unique(temp_stats)[::-1]:
-                temp_sidx = np.where(temp_stats == ustats)[0]
-                temp_sidx = np.random.choice(temp_sidx, size=(len(temp_sidx),), 
-                                             replace=False)
-                temp_end_idx = temp_start_idx+len(temp_sidx)
-                temp_sort_idx[temp_start_idx:temp_end_idx] = temp_sidx
-                temp_start_idx = temp_end_idx
+        a tie then the order is chosen randomly, see PetPriority. 
+        
+        During a battle, the PetPriority of the battle should be used instead 
+        such that the order is only sorted when the teams have changed.
+        
+        """
+        return PetPriority(t0, t1).order
             
-            ### Double check algorithm
-            sorted_attack = [temp_attack[x] for x in temp_sort_idx]
-            sorted_health = [temp_health[x] for x in temp_sort_idx]
-            for iter_idx,tempa in enumerate(sorted_attack[1:-1]):
+
+class PetPriority():
+    """
+    Order that the effects of the pets are performed in. Effects are performed 
+    in the order of highest attack to lowest attack. If there is a tie, then 
+    health values are compared. If there is a tie then the order is chosen 
+    randomly using the random state rs. Orders that only swap interchangeable
+    pets are identical, see tie_label, therefore, only the distinct orders 
+    are chosen from. 
+    
+    The attack, health, and pet of every slot are stored such that the order 
+    is only sorted again when one of these has changed. Ties that remain 
+    between the same pets keep their order and only new ties are chosen 
+    randomly. 
+    
+    The trigger of the ability of the pet in every slot is also stored. 
+    trigger_slots is an index from the trigger, such as Faint or Hurt, to the
+    slots with a pet that can react to it. This allows phases to visit only
+    the pets that are subscribed to the trigger. The index must be updated 
+    with update_triggers after pets are moved and after any ability that may 
+    summon pets or change abilities, such as Whale and Parrot, is activated. 
+    Slots of pets that have fainted are kept in the index until the next 
+    update, which is harmless because empty slots have no ability.
+    
+    If debug is True, then the order is checked after every sort. 
+    
+    """
+    def __init__(self, t0, t1, rs=None, debug=False):
+        self.teams = [t0, t1]
+        if rs == None:
+            rs = MockRandomState()
+        self.rs = rs
+        self.debug = debug
+        
+        ### Pet, attack, and health of every slot when last sorted
+        self.pets = [None for x in range(10)]
+        self.attack = [None for x in range(10)]
+        self.health = [None for x in range(10)]
+        ### Pet priority given as slot idx from 0 to 9
+        self.sort_idx = []
+        ### Ties chosen randomly in the last sort
+        self.ties = set()
+        
+        self.order = []
+        
+        ### Pet and override ability of every slot when the triggers were 
+        ###   last updated
+        self.trigger_pets = [None for x in range(10)]
+        self.trigger_abilities = [None for x in range(10)]
+        ### Trigger of every slot and index from trigger to slots
+        self.triggers = ["none" for x in range(10)]
+        self.trigger_slots = {x: set() for x in battle_triggers}
+        
+        self.update()
+        self.update_triggers()
+    
+    
+    def update(self):
+        """
+        Returns the order as list of (team_idx,pet_idx). The order is only 
+        sorted again if any pet, attack, or health has changed. 
+        
+        """
+        pets = self.pets
+        attack = self.attack
+        health = self.health
+        changed = []
+        iter_idx = 0
+        for team in self.teams:
+            for slot in team.team:
+                pet = slot._pet
+                if pet is not pets[iter_idx]:
+                    pets[iter_idx] = pet
+                    attack[iter_idx] = pet.attack
+                    health[iter_idx] = pet.health
+                    changed.append(iter_idx)
+                elif pet._attack != "none":
+                    if pet.attack != attack[iter_idx] or \
+                            pet.health != health[iter_idx]:
+                        attack[iter_idx] = pet.attack
+                        health[iter_idx] = pet.health
+                        changed.append(iter_idx)
                 iter_idx += 1
-                if tempa < sorted_attack[iter_idx]:
-                    raise Exception("That's impossible. Sorting issue.")
-            for iter_idx,temph in enumerate(sorted_health[1:-1]):
+        
+        if len(changed) > 0:
+            self.sort(changed)
+        
+        return self.order
+    
+    
+    def update_triggers(self):
+        """
+        Updates the trigger index for all slots where the pet or the 
+        override ability of the pet has changed. Returns the number of slots
+        that have changed. 
+        
+        """
+        pets = self.trigger_pets
+        abilities = self.trigger_abilities
+        triggers = self.triggers
+        trigger_slots = self.trigger_slots
+        nchanged = 0
+        iter_idx = 0
+        for team in self.teams:
+            for slot in team.team:
+                pet = slot._pet
+                if pet.override_ability:
+                    ability = pet.override_ability_dict
+                else:
+                    ability = None
+                if pet is not pets[iter_idx] or \
+                        ability is not abilities[iter_idx]:
+                    pets[iter_idx] = pet
+                    abilities[iter_idx] = ability
+                    trigger = pet.ability_record.trigger
+                    if trigger != triggers[iter_idx]:
+                        if triggers[iter_idx] in trigger_slots:
+                            trigger_slots[triggers[iter_idx]].discard(iter_idx)
+                        if trigger in trigger_slots:
+                            trigger_slots[trigger].add(iter_idx)
+                        triggers[iter_idx] = trigger
+                    nchanged += 1
                 iter_idx += 1
-                if temph < sorted_health[iter_idx]:
-                    raise Exception("That's impossible. Sorting issue.")
-            
-            ### Dereference temp_sort_idx and store in sort_idx
-            end_idx = start_idx + len(temp_idx)
-            sort_idx[start_idx:end_idx] = temp_idx
-            start_idx = end_idx
-
-        ### Finish sorting by max attack
-        attack = np.array([attack[x] for x in sort_idx])
-        health = np.array([health[x] for x in sort_idx])
-        teams = np.array([teams[x] for x in sort_idx])
-        idx = np.array([idx[x] for x in sort_idx])
-
-        ### Double check sorting algorithm
-        for iter_idx,tempa in enumerate(attack[1:-1]):
-            iter_idx += 2
-            if tempa < attack[iter_idx]:
-                raise Exception("That's impossible. Sorting issue.") 
-        
-        ### Build final queue
-        pet_priority = []
-        for t,i in zip(teams,idx):
-            if [t0,t1][t][i].empty == True:
+        return nchanged
+    
+    
+    def sort(self, changed=()):
+        """
+        Sorts the pets starting from the previous order. Pets in the changed
+        slots are not allowed to keep the order of previous ties. 
+        
+        """
+        pets = self.pets
+        attack = self.attack
+        health = self.health
+        
+        ### Start from the previous order such that the sort is fast and ties
+        ###   keep their order
+        sort_idx = [x for x in self.sort_idx if pets[x].name != "pet-none"]
+        for iter_idx in changed:
+            if pets[iter_idx].name == "pet-none":
                 continue
-            pet_priority.append((t,i))
+            if iter_idx not in sort_idx:
+                sort_idx.append(iter_idx)
+        sort_idx.sort(key=lambda x: (-attack[x], -health[x]))
         
-        return pet_priority
-            
+        ### Choose order of new ties randomly
+        ties = set()
+        start_idx = 0
+        while start_idx < len(sort_idx):
+            first = sort_idx[start_idx]
+            end_idx = start_idx+1
+            while end_idx < len(sort_idx):
+                temp_idx = sort_idx[end_idx]
+                if attack[temp_idx] != attack[first] or \
+                        health[temp_idx] != health[first]:
+                    break
+                end_idx += 1
+            if end_idx-start_idx > 1:
+                tie = tuple(sorted(sort_idx[start_idx:end_idx]))
+                ties.add(tie)
+                new_tie = tie not in self.ties
+                for iter_idx in changed:
+                    if iter_idx in tie:
+                        new_tie = True
+                if new_tie:
+                    temp_idx = sort_idx[start_idx:end_idx]
+                    labels = [tie_label(pets[x], (x // 5, x % 5)) 
+                              for x in temp_idx]
+                    orders = distinct_orders(labels)
+                    choice_idx = orders[self.rs.choice(len(orders))]
+                    sort_idx[start_idx:end_idx] = [temp_idx[x] for x in choice_idx]
+            start_idx = end_idx
+        
+        self.sort_idx = sort_idx
+        self.ties = ties
+        self.order = [(x // 5, x % 5) for x in sort_idx]
+        
+        if self.debug:
+            self.check()
+    
+    
+    def check(self):
+        """ Checks that the order is correct """
+        filled_idx = [x for x in range(10) if self.pets[x].name != "pet-none"]
+        if sorted(self.sort_idx) != filled_idx:
+            raise Exception("That's impossible. Sorting issue.")
+        for temp_idx,next_idx in zip(self.sort_idx[:-1], self.sort_idx[1:]):
+            if self.attack[temp_idx] < self.attack[next_idx]:
+                raise Exception("That's impossible. Sorting issue.")
+            if self.attack[temp_idx] == self.attack[next_idx]:
+                if self.health[temp_idx] < self.health[next_idx]:
+                    raise Exception("That's impossible. Sorting issue.")
+        for iter_idx,(team_idx,pet_idx) in enumerate(self.order):
+            pet = self.teams[team_idx][pet_idx].pet
+            if pet is not self.pets[self.sort_idx[iter_idx]]:
+                raise Exception("That's impossible. Sorting issue.")
+            if pet.attack != self.attack[self.sort_idx[iter_idx]]:
+                raise Exception("That's impossible. Sorting issue.")
+    
+    
+    def copy(self, t0, t1, rs=None):
+        """
+        Copy of the PetPriority for copies of the teams t0 and t1 with pets in 
+        the same slots. The previous order, including ties, is kept. 
+        
+        """
+        if rs == None:
+            rs = self.rs
+        priority = PetPriority.__new__(PetPriority)
+        priority.teams = [t0, t1]
+        priority.rs = rs
+        priority.debug = self.debug
+        priority.pets = [slot._pet for team in priority.teams 
+                         for slot in team.team]
+        priority.attack = list(self.attack)
+        priority.health = list(self.health)
+        priority.sort_idx = list(self.sort_idx)
+        priority.ties = set(self.ties)
+        priority.order = list(self.order)
+        priority.trigger_pets = [slot._pet for team in priority.teams 
+                                 for slot in team.team]
+        priority.trigger_abilities = list(self.trigger_abilities)
+        priority.triggers = list(self.triggers)
+        priority.trigger_slots = {key: set(value) for key,value 
+                                  in self.trigger_slots.items()}
+        return priority
 
 
+def tie_label(pet, slot):
+    """
+    Label of the pet in the slot (team_idx, pet_idx) for breaking ties in 
+    the pet priority. Pets of the same team with identical stats are 
+    interchangeable in the order if they have no ability or status that is 
+    activated during the battle. These have identical labels and all other 
+    pets have a unique label. 
+    
+    """
+    if pet.ability["trigger"] in battle_triggers or \
+            pet.status in faint_statuses:
+        return slot
+    return (slot[0], pet.name, pet._attack, pet._health, 
+            pet._until_end_of_battle_attack_buff,
+            pet._until_end_of_battle_health_buff,
+            pet.status, pet.level, pet._hurt, pet.ability_counter)
+    
+    
 class RBattle(Battle):
     """
     This class will calculate all possible outcomes of a SAP battle considering
@@ -325,36 +774,190 @@ class RBattle(Battle):
     are evaluated exactly rather than requiring bootstrapped probabilities. 
     
     Disadvantage is that it is possible that huge number of paths must be 
-    evaluated to determine exact probabilities. Protection against (could) be
+    evaluated to determine exact probabilities. Protection against this is 
     implemented in two ways:
-        1. Determining that paths lead to nomial identical results and can 
-            merge back together improving calculation efficiency
-        2. Define a maximum path size and if the number paths detected is larger 
-            then probabilities are bootstrapped. 
+        1. After the start of the battle and after every attack, paths that 
+            have lead to identical teams are merged together and their 
+            probabilities are summed.
+        2. If the total number of branches that have been evaluated over all
+            steps is larger than max_paths, then the probabilities of the 
+            remaining paths are bootstrapped using nsamples random battles.
+    
+    Every random choice made by the pets and every random tie-break in 
+    the PetPriority is enumerated using a BranchRandomState. Tie-breaks that
+    only swap interchangeable pets are not enumerated separately, see 
+    tie_label.
     
     """
-    def __init__(self, t0, t1, max_paths=1000):
+    def __init__(self, t0, t1, max_paths=1000, nsamples=1000, seed=None):
         """
         Performs the battle between the input teams t1 and t2. 
         
+        Arguments
+        ---------
+        t0: Team
+            First team
+        t1: Team
+            Second team
+        max_paths: int
+            Maximum number of branches that are evaluated exactly, summed 
+            over all steps
+        nsamples: int
+            Number of random battles used if max_paths is exceeded
+        seed: int
+            Seed for the random battles used if max_paths is exceeded
+        
         """
-        ### Make copy each team to cary out the battle so that the original
-        ### pets are not modified in any way after the battle
-        self.t0 = t0.copy()
-        self.t0._battle = True
-        self.t1 = t1.copy()
-        self.t1._battle = True
+        super().__init__(t0, t1, history=False)
+        ### PetPriority is built by the first step such that the tie-breaks 
+        ###   are enumerated
+        self.priority = None
+        self.max_paths = max_paths
+        self.nsamples = nsamples
+        self.rs = np.random.RandomState(seed)
         
         ### Internal storage
         self.battle_list = []
+        ### Number of branches that were evaluated over all steps
+        self.npaths = 0
+        ### False if the probabilities were bootstrapped
+        self.exact = True
+    
+    
+    def battle(self):
+        """
+        Returns the probabilities of t0 win, t1 win, and draw as an array.
         
-        ### Build initial effect queue order
-        self.pet_priority = self.update_pet_priority(self.t0, self.t1)
+        """
+        probs = np.zeros((3,))
+        paths = [(self, 1)]
+        step = 0
+        while len(paths) > 0:
+            ### Evaluate all branches of the current step
+            merged = {}
+            branch_list = []
+            for battle_obj,prob in paths:
+                temp_branch_list = self.branch_step(battle_obj,step)
+                if temp_branch_list == None:
+                    break
+                branch_list.append((prob,temp_branch_list))
+            if len(branch_list) != len(paths):
+                ### Too many branches have been evaluated
+                self.exact = False
+                probs += self.sample_paths(paths, step)
+                paths = []
+                break
+            
+            for prob,temp_branch_list in branch_list:
+                for child,child_prob,result in temp_branch_list:
+                    if result >= 0:
+                        probs[result] += prob*child_prob
+                        continue
+                    key = child.state_key()
+                    if key in merged:
+                        merged[key][1] += prob*child_prob
+                    else:
+                        merged[key] = [child, prob*child_prob]
+            paths = list(merged.values())
+            step += 1
+        
+        self.battle_list = paths
+        return probs
+    
+    
+    def branch_step(self, battle_obj, step):
+        """
+        Performs all branches of the given step for the battle_obj. Step 0 is 
+        the start of the battle and step n is attack n-1. 
+        
+        Returns list of (Battle, probability, result) for every branch. Result
+        is -1 if the battle has not finished. Returns None if the total number
+        of branches that have been evaluated is larger than max_paths.
+        
+        """
+        branch_list = []
+        scripts = [()]
+        while len(scripts) > 0:
+            script = scripts.pop()
+            rs = BranchRandomState(script)
+            child = battle_obj.copy_battle(rs)
+            result = child.run_step(step)
+            branch_list.append((child, rs.probability, result))
+            self.npaths += 1
+            if self.npaths > self.max_paths:
+                return None
+            
+            ### Every choice beyond the script is a new branch point. Options 
+            ###   other than the first are added as new scripts. 
+            chosen = tuple(rs.chosen)
+            for iter_idx in range(len(script),len(rs.branches)):
+                for option_idx in range(1,len(rs.branches[iter_idx])):
+                    scripts.append(chosen[:iter_idx]+(option_idx,))
+        
+        return branch_list
+    
+    
+    def sample_paths(self, paths, step):
+        """
+        Bootstraps the probabilities for all given paths using random battles 
+        starting from the given step. 
+        
+        """
+        probs = np.zeros((3,))
+        path_probs = np.array([x[1] for x in paths])
+        total_prob = np.sum(path_probs)
+        counts = self.rs.multinomial(self.nsamples, path_probs/total_prob)
+        for (battle_obj,prob),count in zip(paths,counts):
+            for _ in range(count):
+                child = battle_obj.copy_battle(BranchRandomState(rs=self.rs))
+                temp_step = step
+                while True:
+                    result = child.run_step(temp_step)
+                    temp_step += 1
+                    if result >= 0:
+                        break
+                probs[result] += total_prob/self.nsamples
+        return probs
+    
+    
+    def copy_battle(self, rs):
+        """
+        Copy of the battle where all pets use the random state rs
+        
+        """
+        child = RBattle.__new__(RBattle)
+        child.__dict__.update(self.__dict__)
+        child.t0 = self.t0.copy()
+        child.t1 = self.t1.copy()
+        for team in [child.t0, child.t1]:
+            for slot in team:
+                if slot.empty:
+                    continue
+                slot.pet.rs = rs
+        if self.priority == None:
+            child.priority = PetPriority(child.t0, child.t1, rs=rs, 
+                                         debug=self.debug)
+        else:
+            child.priority = self.priority.copy(child.t0, child.t1, rs=rs)
+        child.pet_priority = child.priority.update()
+        return child
+    
+    
+    def run_step(self, step):
+        """
+        Performs the start of the battle for step 0 and attack step-1 
+        otherwise. Returns the result if the battle has finished and -1 
+        otherwise. 
         
-        raise Exception("Not implemented")
+        """
+        if step == 0:
+            self.start()
+            return -1
+        if self.attack(step-1) == False:
+            return self.check_battle_result()
+        return -1
 
 
-    
 def battle_phase(
                 battle_obj,
                 phase,  
@@ -372,11 +975,17 @@ def battle_phase(
     
     ##### Trigger logic for starting battle
     if phase.startswith("phase_move"):
-        start_order = [[str(x) for x in teams[0]], [str(x) for x in teams[1]]]
+        if phase_dict[phase] is None:
+            teams[0].move_forward()
+            teams[1].move_forward()
+            battle_obj.priority.update_triggers()
+            return
+        start_order = [team_snapshot(teams[0]), team_snapshot(teams[1])]
         teams[0].move_forward()
         teams[1].move_forward()
-        end_order = [[str(x) for x in teams[0]], [str(x) for x in teams[1]]]
+        end_order = [team_snapshot(teams[0]), team_snapshot(teams[1])]
         phase_dict[phase] = [start_order, end_order]
+        battle_obj.priority.update_triggers()
         
     elif phase == "phase_start":
         battle_phase_start(battle_obj,phase,teams,pet_priority,phase_dict)
@@ -393,7 +1002,7 @@ def battle_phase(
         battle_phase_attack_after(battle_obj,phase,teams,pet_priority,phase_dict)
 
     elif "phase_hurt_and_faint" in phase:
-        battle_phase_hurt_and_faint(battle_obj,phase,teams,pet_priority,phase_dict)
+        return battle_phase_hurt_and_faint(battle_obj,phase,teams,pet_priority,phase_dict)
     
     elif phase == "phase_knockout":
         battle_phase_knockout(battle_obj,phase,teams,pet_priority,phase_dict)
@@ -402,8 +1011,36 @@ def battle_phase(
         raise Exception("Phase {} not found".format(phase))
 
 
+def iter_phase_events(turn_name, phase_dict):
+    """
+    Yields the events of the phase_dict of one turn as (turn_name, phase, 
+    entry). The entry of the move phases, which holds the order of the teams
+    before and after moving, is yielded as a single event. 
+    
+    """
+    for phase,phase_list in phase_dict.items():
+        if len(phase_list) == 0:
+            continue
+        if phase.startswith("phase_move"):
+            yield (turn_name, phase, phase_list)
+            continue
+        for entry in phase_list:
+            yield (turn_name, phase, entry)
+
+
 def append_phase_list(phase_list,p,team_idx,pet_idx,activated,targets,possible):
-    if activated:
+    """
+    Stores the activated effect in the phase_list. If the phase_list is None,
+    then the history is not being stored and nothing is built. 
+    
+    Returns the number of activated effects, which is used in place of the 
+    length of the phase_list to determine if anything has occured during a 
+    phase. 
+    
+    """
+    if not activated:
+        return 0
+    if phase_list is not None:
         tiger = False
         if len(targets) > 0:
             if type(targets[0]) == list:
@@ -414,15 +1051,16 @@ def append_phase_list(phase_list,p,team_idx,pet_idx,activated,targets,possible):
             phase_list.append((
                 func.__name__,
                 (team_idx,pet_idx),
-                (p.__repr__()),
-                [str(x) for x in targets]))
+                pet_snapshot(p),
+                targets_snapshot(targets)))
         else:
             for temp_target in targets:
                 phase_list.append((
                     func.__name__,
                     (team_idx,pet_idx),
-                    (p.__repr__()),
-                    [str(x) for x in temp_target]))
+                    pet_snapshot(p),
+                    targets_snapshot(temp_target)))
+    return 1
 
 
 def check_summon_triggers(phase_list,
@@ -433,6 +1071,11 @@ def check_summon_triggers(phase_list,
                           activated,
                           targets,
                           possible):
+    """
+    Checks friend summoned triggers for all pets summoned by p. Returns the 
+    number of summoned triggers that were activated. 
+    
+    """
     if activated == False:
         return 0
     
@@ -453,21 +1096,23 @@ def check_summon_triggers(phase_list,
                 temp_all_targets += entry
             targets = temp_all_targets
             
+    nactivated = 0
     for temp_te in targets:
         for temp_slot in fteam:
             temp_pet = temp_slot.pet
             tempa,tempt,tempp = temp_pet.friend_summoned_trigger(temp_te)
-            append_phase_list(phase_list, 
-                              temp_pet, 
-                              team_idx, 
-                              pet_idx,
-                              tempa,tempt,tempp)
+            nactivated += append_phase_list(phase_list, 
+                                            temp_pet, 
+                                            team_idx, 
+                                            pet_idx,
+                                            tempa,tempt,tempp)
     
-    return len(targets)
+    return nactivated
     
 def check_self_summoned_triggers(teams,
                                  pet_priority,
-                                 phase_dict):
+                                 phase_dict,
+                                 priority):
     """
     Currently only butterfly
     
@@ -475,7 +1120,10 @@ def check_self_summoned_triggers(teams,
     
     phase_list = phase_dict["phase_start"]
     pp = pet_priority
+    summoned_slots = priority.trigger_slots["Summoned"]
     for team_idx,pet_idx in pp:
+        if team_idx*5+pet_idx not in summoned_slots:
+            continue
         p = teams[team_idx][pet_idx].pet
         if p.health <= 0:
             continue
@@ -491,14 +1139,15 @@ def check_self_summoned_triggers(teams,
 
 def check_status_triggers(phase_list,p,team_idx,pet_idx,teams):
     if p.status not in ["status-honey-bee", "status-extra-life"]:
-        return 
+        return 0
     
     ability = data["statuses"][p.status]["ability"]
     p.set_ability(ability)
     te_idx = [team_idx,pet_idx]
     activated,targets,possible = p.faint_trigger(p, te_idx)
-    append_phase_list(phase_list,p,team_idx,pet_idx,activated,targets,possible)
-    check_summon_triggers(phase_list,
+    nactivated = append_phase_list(phase_list,p,team_idx,pet_idx,
+                                   activated,targets,possible)
+    nactivated += check_summon_triggers(phase_list,
                             p,
                             team_idx,
                             pet_idx,
@@ -506,6 +1155,7 @@ def check_status_triggers(phase_list,p,team_idx,pet_idx,teams):
                             activated,
                             targets,
                             possible)
+    return nactivated
     
 
 def battle_phase_start(battle_obj,
@@ -515,13 +1165,20 @@ def battle_phase_start(battle_obj,
                        phase_dict):
     phase_list = phase_dict["phase_start"]
     pp = pet_priority
+    priority = battle_obj.priority
+    sob_slots = priority.trigger_slots["StartOfBattle"]
     for team_idx,pet_idx in pp:
+        if team_idx*5+pet_idx not in sob_slots:
+            continue
         p = teams[team_idx][pet_idx].pet
         fteam,oteam = get_teams([team_idx,pet_idx],teams)
         activated,targets,possible = p.sob_trigger(oteam)
         append_phase_list(phase_list,p,team_idx,pet_idx,activated,targets,possible)
+        if activated:
+            ### Abilities may have been swallowed
+            priority.update_triggers()
     
-    check_self_summoned_triggers(teams,pet_priority,phase_dict)
+    check_self_summoned_triggers(teams,pet_priority,phase_dict,priority)
     
     return phase_list
 
@@ -531,14 +1188,25 @@ def battle_phase_hurt_and_faint(battle_obj,
                                 teams,
                                 pet_priority,
                                 phase_dict):
+    """
+    Performs all faint and hurt triggers until no pets are fainted or hurt. 
+    Returns the number of events that occured, which is equal to the number 
+    of entries added to the phase list when the history is stored.
+    
+    """
     phase_list = phase_dict[phase]
     pp = pet_priority
+    priority = battle_obj.priority
+    ### Only pets with a faint or hurt ability are visited
+    faint_slots = priority.trigger_slots["Faint"]
+    hurt_slots = priority.trigger_slots["Hurt"]
     status_list = []
+    nevents = 0
     while True:
         ### Get a list of fainted pets
         fainted_list = []
         for team_idx,pet_idx in pp:
-            p = teams[team_idx][pet_idx].pet
+            p = teams[team_idx].team[pet_idx]._pet
             if p.name == "pet-none":
                 continue
             if p.health <= 0:
@@ -553,12 +1221,16 @@ def battle_phase_hurt_and_faint(battle_obj,
             fainted_pet = fteam[pet_idx].pet
             ### Check for all pets that trigger off this fainted pet (including self)
             for te_team_idx,te_pet_idx in pp:
+                if te_team_idx*5+te_pet_idx not in faint_slots:
+                    continue
                 other_pet = teams[te_team_idx][te_pet_idx].pet
                 te_idx = [te_team_idx,te_pet_idx]
                 activated,targets,possible = other_pet.faint_trigger(fainted_pet,te_idx,oteam)
                 if activated:
                     faint_targets_list.append([fainted_pet,te_team_idx,te_pet_idx,activated,targets,possible])
-                append_phase_list(phase_list,
+                    ### Pets may have been summoned into the slots
+                    priority.update_triggers()
+                nevents += append_phase_list(phase_list,
                                 other_pet,
                                 te_team_idx,
                                 te_pet_idx,
@@ -571,16 +1243,18 @@ def battle_phase_hurt_and_faint(battle_obj,
             if teams[team_idx].check_friend(fainted_pet):
                 teams[team_idx].remove(fainted_pet)
                 ### Add this info to phase list
-                phase_list.append((
-                    "Fainted",
-                    (team_idx,pet_idx),
-                    (fainted_pet.__repr__()),
-                    [""]))
+                nevents += 1
+                if phase_list is not None:
+                    phase_list.append((
+                        "Fainted",
+                        (team_idx,pet_idx),
+                        pet_snapshot(fainted_pet),
+                        [""]))
 
         ### If pet was summoned, then need to check for summon triggers
         for fainted_pet,team_idx,pet_idx,activated,targets,possible in faint_targets_list:
             fteam,_ = get_teams([team_idx,pet_idx],teams)
-            check_summon_triggers(phase_list,
+            nevents += check_summon_triggers(phase_list,
                                 fainted_pet,
                                 team_idx,
                                 pet_idx,
@@ -592,12 +1266,19 @@ def battle_phase_hurt_and_faint(battle_obj,
         ### If pet was hurt, then need to check for hurt triggers
         hurt_list = []
         for team_idx,pet_idx in pp:
+            p = teams[team_idx].team[pet_idx]._pet
+            if p._hurt <= 0:
+                continue
+            if team_idx*5+pet_idx not in hurt_slots:
+                ### Same as calling hurt_trigger until the pet is not hurt
+                hurt_list.append([team_idx,pet_idx])
+                p._hurt = 0
+                continue
             fteam,oteam = get_teams([team_idx,pet_idx],teams)
-            p = fteam[pet_idx].pet
             while p._hurt > 0:
                 hurt_list.append([team_idx,pet_idx])
                 activated,targets,possible = p.hurt_trigger(oteam)
-                append_phase_list(phase_list,
+                nevents += append_phase_list(phase_list,
                                 p,
                                 team_idx,
                                 pet_idx,
@@ -605,7 +1286,7 @@ def battle_phase_hurt_and_faint(battle_obj,
                                 targets,
                                 possible)
 
-        battle_obj.pet_priority = battle_obj.update_pet_priority(battle_obj.t0, battle_obj.t1)
+        battle_obj.pet_priority = priority.update()
         pp = battle_obj.pet_priority
 
         ### If nothing happend, stop the loop
@@ -614,9 +1295,12 @@ def battle_phase_hurt_and_faint(battle_obj,
 
     ### Check for status triggers on pet
     for p,team_idx,pet_idx in status_list:
-        check_status_triggers(phase_list,p,team_idx,pet_idx,teams)
+        nevents += check_status_triggers(phase_list,p,team_idx,pet_idx,teams)
+    if len(status_list) > 0:
+        ### Status abilities may have summoned pets
+        priority.update_triggers()
     
-    return phase_list
+    return nevents
 
 
 def battle_phase_attack_before(battle_obj,
@@ -706,13 +1390,13 @@ def battle_phase_attack_after(battle_obj,
     pp = pet_priority
     
     #### Can get the two animals that just previously attacked from the 
-    ####   phase_dict
-    attack_history = phase_dict["phase_attack"]
-    if len(attack_history) == 0:
+    ####   battle_obj
+    attack_idx = battle_obj.attack_idx
+    if len(attack_idx) == 0:
         return phase_dict
     
-    t0_pidx = attack_history[0][1][0]
-    t1_pidx = attack_history[0][1][1]
+    t0_pidx = attack_idx[0]
+    t1_pidx = attack_idx[1]
     
     for team_idx,pet_idx in pp:
         ### Check if current pet is directly behind the pet that just attacked
@@ -739,14 +1423,12 @@ def battle_phase_knockout(battle_obj,
     phase_list = phase_dict[phase]
     pp = pet_priority
     
-    #### Get knockout list from the end of the phase_attack info and remove
-    ####   the knockout list from phase attack
-    attack_history = phase_dict["phase_attack"]
-    if len(attack_history) == 0:
-        return phase_dict
-    knockout_list = attack_history[-1]
-    phase_dict["phase_attack"] = phase_dict["phase_attack"][0:-1]
-
+    #### Get knockout list stored during the attack phase
+    knockout_list = battle_obj.knockout_list
+    battle_obj.knockout_list = []
+    
+    ### Number of events in phase_hurt_and_faint_k for all knockouts
+    nevents = 0
     for apet,team_idx in knockout_list:
         if apet.health > 0:
             ### Need to loop to handle Rhino
@@ -762,82 +1444,39 @@ def battle_phase_knockout(battle_obj,
                     ### Easy breaking condition
                     break
                 
-                battle_phase(battle_obj,
-                            "phase_hurt_and_faint_k",
-                            teams,
-                            pet_priority,
-                            phase_dict)
+                nevents += battle_phase(battle_obj,
+                                        "phase_hurt_and_faint_k",
+                                        teams,
+                                        pet_priority,
+                                        phase_dict)
                 
-                if len(phase_dict["phase_hurt_and_faint_k"]) == current_length:
+                if nevents == current_length:
                     ### No more recursion needed because nothing else fainted
                     break
                 else:
                     ### Otherwise, something has been knockedout by Rhino 
                     ### ability and while loop should iterate again
-                    current_length = len(phase_dict["phase_hurt_and_faint_k"])
+                    current_length = nevents
                     
     return phase_dict
     
 
 def get_attack(p0,p1):
-    """ Ugly but works """
-    attack_list = [int(p0.attack), int(p1.attack)]
-    
-    ### Garlic
-    if p0.status == "status-garlic-armor":
-        attack_list[1] -= 2
-        attack_list[1] = max([attack_list[1], 1])
-    if p1.status ==  "status-garlic-armor":
-        attack_list[0] -= 2
-        attack_list[0] = max([attack_list[0], 1])
-        
-    ### Melon
-    if p0.status == "status-melon-armor":
-        attack_list[1] -= 20
-        attack_list[1] = max([attack_list[1], 0])
-        p0.status = "none"
-    if p1.status == "status-melon-armor":
-        attack_list[0] -= 20
-        attack_list[0] = max([attack_list[0], 0])
-        p1.status = "none"
-        
-    ### Meat
-    if p0.status == "status-bone-attack":
-        attack_list[0] = attack_list[0]+5
-    if p1.status == "status-bone-attack":
-        attack_list[1] = attack_list[1]+5
-        
-    ### Steak
-    if p0.status == "status-steak-attack":
-        attack_list[0] = attack_list[0]+20
-        p0.status = "none"
-    if p1.status == "status-steak-attack":
-        attack_list[1] = attack_list[1]+20
-        p0.status = "none"
-    
-    ### Weak
-    if p0.status == "status-weak":
-        attack_list[1] = attack_list[1]+3
-    if p1.status == "status-weak":
-        attack_list[0] = attack_list[0]+3
-
-    ### Coconut
-    if p0.status == "status-coconut-shield":
-        attack_list[1] = 0
-        p0.status = "none"
-    if p1.status == "status-coconut-shield":
-        attack_list[0] = 0
-        p1.status = "none"
-    
-    ### Finally checking for poison after all other equipment already applied
-    if p0.status == "status-poison-attack":
-        if attack_list[0] > 0:
-            attack_list[0] = p1.health
-    if p1.status == "status-poison-attack":
-        if attack_list[1] > 0:
-            attack_list[1] = p0.health
-    
-    return attack_list
+    """
+    Returns the damage that p0 and p1 deal to each other. Statuses that are 
+    consumed by the attack are removed from the pets. Damage is calculated 
+    using the status tables of sapai.statuses.
+    
+    """
+    s0 = p0._status
+    s1 = p1._status
+    a0 = get_damage(int(p0.attack), s0, s1, p1.health)
+    a1 = get_damage(int(p1.attack), s1, s0, p0.health)
+    if status_consumed_defend[s0] or status_consumed_attack[s0]:
+        p0._status = none_id
+    if status_consumed_defend[s1] or status_consumed_attack[s1]:
+        p1._status = none_id
+    return [a0,a1]
         
 
 def battle_phase_attack(battle_obj, 
@@ -847,6 +1486,8 @@ def battle_phase_attack(battle_obj,
                         phase_dict):
     phase_list = phase_dict["phase_attack"]
     aidx,nidx = get_attack_idx(phase,teams,pet_priority,phase_dict)
+    battle_obj.attack_idx = ()
+    battle_obj.knockout_list = []
     if len(aidx) != 2:
         ### Must be two animals available for attacking to continue with battle
         return phase_list
@@ -859,70 +1500,73 @@ def battle_phase_attack(battle_obj,
     
     teams[0][aidx[0][1]].pet.hurt(p1a)
     teams[1][aidx[1][1]].pet.hurt(p0a)
-    phase_list.append([
-            "Attack",
-            (aidx[0]),
-            str(p0),
-            [str(p1)]])
+    battle_obj.attack_idx = aidx[0]
+    if phase_list is not None:
+        phase_list.append([
+                "Attack",
+                (aidx[0]),
+                pet_snapshot(p0),
+                [pet_snapshot(p1)]])
     
     ### Keep track of knockouts for rhino and hippo by:
     ###   (attacking_pet, team_idx)
-    knockout_list = []
+    knockout_list = battle_obj.knockout_list
     if teams[0][aidx[0][1]].pet.health <= 0:
         knockout_list.append((p1,1))
     if teams[1][aidx[1][1]].pet.health <= 0:
         knockout_list.append((p0,0))
     
     ### Implement chili
-    if p0.status == "status-splash-attack":
+    if p0._status == splash_id:
         original_attack = p0._attack
         original_tmp_attack = p0._until_end_of_battle_attack_buff
-        original_status = p0.status
+        original_status = p0._status
         p0._attack = 5
         p0._until_end_of_battle_attack_buff = 0
         if len(nidx[1]) != 0:
             pn1 = teams[1][nidx[1][1]].pet
             p0a,p1a = get_attack(p0,pn1)
             pn1.hurt(p0a)
-            phase_list.append([
-                "splash",
-                (aidx[0]),
-                (str(p0)),
-                [str(pn1)]])
+            if phase_list is not None:
+                phase_list.append([
+                    "splash",
+                    (aidx[0]),
+                    pet_snapshot(p0),
+                    [pet_snapshot(pn1)]])
             
             if pn1.health <= 0:
                 knockout_list.append((p0,0))
                 
-        p0.status = original_status
+        p0._status = original_status
         p0._attack = original_attack
         p0._until_end_of_battle_attack_buff = original_tmp_attack
         
-    if p1.status == "status-splash-attack":
+    if p1._status == splash_id:
         original_attack = p1._attack
         original_tmp_attack = p1._until_end_of_battle_attack_buff
-        original_status = p1.status
+        original_status = p1._status
         p1._attack = 5
         p1._until_end_of_battle_attack_buff = 0
         if len(nidx[0]) != 0:
             pn0 = teams[0][nidx[0][1]].pet
             p0a,p1a = get_attack(pn0,p1)
             pn0.hurt(p1a)
-            phase_list.append([
-                "splash",
-                (aidx[1]),
-                (str(p1)),
-                [str(pn0)]])
+            if phase_list is not None:
+                phase_list.append([
+                    "splash",
+                    (aidx[1]),
+                    pet_snapshot(p1),
+                    [pet_snapshot(pn0)]])
             
             if pn0.health <= 0:
                 knockout_list.append((p1,1))
                 
-        p1.status = original_status
+        p1._status = original_status
         p1._attack = original_attack
         p1._until_end_of_battle_attack_buff = original_tmp_attack
     
-    ### Add knockout list to the end of phase_list. This is later removed
-    ###   in the knockout phase
-    phase_list.append(knockout_list)
+    ### The knockout list is stored by the battle_obj and is used in the 
+    ###   knockout phase
     
     return phase_dict
 
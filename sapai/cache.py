@@ -0,0 +1,232 @@
+#%%
+
+import shelve
+from collections import OrderedDict
+import numpy as np
+
+from sapai.battle import Battle,RBattle
+from sapai.estimate import check_deterministic
+
+
+class BattleCache():
+    """
+    Cache for the outcomes of battles between pairs of teams. This is useful
+    when the same pairs of teams are battled many times, for example for
+    roundrobin or the DatabaseLookupRanker.
+
+    Entries are keyed by a canonical encoding of the pair (t0,t1). Empty slots
+    are not part of the encoding because pets are moved forward before any
+    effects occur. The two teams are ordered in the key, such that the
+    mirrored pair (t1,t0) uses the same entry with the result flipped.
+
+    The probabilities of t0 win, t1 win, and draw are stored for every entry.
+    These are calculated using RBattle, unless the battle is deterministic,
+    such that battles with random effects are not collapsed to the result of
+    a single random battle. The result of
+    a cached battle is then drawn from these probabilities.
+
+    Entries are stored in memory with a maximum of maxsize entries, where the
+    least recently used entry is removed first. If a path is provided, all
+    entries are also stored on disk using shelve. Entries that are not found
+    in memory are then loaded from the disk.
+
+    """
+    def __init__(self,
+                 maxsize=100000,
+                 path=None,
+                 max_paths=1000,
+                 nsamples=1000,
+                 seed=None):
+        """
+        Arguments
+        ---------
+        maxsize: int
+            Maximum number of entries stored in memory
+        path: str
+            Path of the shelve file used to store entries on disk. No entries
+            are stored on disk if None.
+        max_paths: int
+            max_paths used for RBattle
+        nsamples: int
+            nsamples used for RBattle
+        seed: int
+            Seed for drawing the results of battles and for RBattle
+
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self.max_paths = max_paths
+        self.nsamples = nsamples
+        self.rs = np.random.RandomState(seed)
+
+        self.memory = OrderedDict()
+        if path is not None:
+            self.disk = shelve.open(path)
+        else:
+            self.disk = None
+
+        ### Counters for the lookups of the cache
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+
+    def key(self, t0, t1):
+        """
+        Returns the key of the pair of teams and whether the teams have been
+        flipped in the key.
+
+        """
+        k0 = team_key(t0)
+        k1 = team_key(t1)
+        if k1 < k0:
+            return (k1,k0),True
+        return (k0,k1),False
+
+
+    def get(self, t0, t1):
+        """
+        Returns the probabilities of t0 win, t1 win, and draw if the pair is
+        found in the cache and None otherwise.
+
+        """
+        key,flip = self.key(t0,t1)
+        probs = self.memory.get(key, None)
+        if probs is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+        elif self.disk is not None and str(key) in self.disk:
+            probs = self.disk[str(key)]
+            self.store(key, probs)
+            self.hits += 1
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            return None
+
+        if flip:
+            return np.array([probs[1], probs[0], probs[2]])
+        return np.array(probs)
+
+
+    def put(self, t0, t1, probs):
+        """
+        Stores the probabilities of t0 win, t1 win, and draw for the pair.
+
+        """
+        key,flip = self.key(t0,t1)
+        probs = [float(x) for x in probs]
+        if flip:
+            probs = [probs[1], probs[0], probs[2]]
+        self.store(key, probs)
+        if self.disk is not None:
+            self.disk[str(key)] = probs
+
+
+    def store(self, key, probs):
+        """ Stores the entry in memory, removing the least recently used """
+        self.memory[key] = probs
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+
+    def probabilities(self, t0, t1):
+        """
+        Returns the probabilities of t0 win, t1 win, and draw. These are
+        calculated and stored if not found in the cache. A single Battle is
+        performed if the battle is deterministic and RBattle is used 
+        otherwise.
+
+        """
+        probs = self.get(t0,t1)
+        if probs is None and check_deterministic(t0,t1):
+            probs = np.zeros((3,))
+            probs[Battle(t0,t1,history=False).battle()] = 1
+            self.put(t0,t1,probs)
+        elif probs is None:
+            b = RBattle(t0, t1,
+                        max_paths=self.max_paths,
+                        nsamples=self.nsamples,
+                        seed=self.rs.randint(0,2**31))
+            probs = b.battle()
+            self.put(t0,t1,probs)
+        return probs
+
+
+    def battle(self, t0, t1):
+        """
+        Same as Battle(t0,t1).battle() using the cache. Returns 0 for t0 win,
+        1 for t1 win, 2 for draw.
+
+        """
+        return self.sample(self.probabilities(t0,t1))
+
+
+    def sample(self, probs):
+        """ Draws the result of a battle from the probabilities """
+        result = int(np.argmax(probs))
+        if probs[result] > 1-1e-9:
+            ### Deterministic result
+            return result
+        probs = np.array(probs)
+        return int(self.rs.choice(3, p=probs/np.sum(probs)))
+
+
+    @property
+    def hit_rate(self):
+        total = self.hits+self.misses
+        if total == 0:
+            return 0
+        return self.hits/total
+
+
+    def clear(self):
+        """ Removes all entries from memory and from disk """
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+
+    def __len__(self):
+        return len(self.memory)
+
+
+    def __repr__(self):
+        return "< BattleCache {} entries, {} hits, {} misses >".format(
+            len(self), self.hits, self.misses)
+
+
+def pet_key(pet):
+    """ Encoding of all attributes of the pet that are used in a battle """
+    if pet.override_ability:
+        ability_key = str(pet.override_ability_dict)
+    else:
+        ability_key = ""
+    return (pet.name,
+            pet._attack,
+            pet._health,
+            pet._until_end_of_battle_attack_buff,
+            pet._until_end_of_battle_health_buff,
+            pet.status,
+            pet.level,
+            pet._hurt,
+            pet.ability_counter,
+            ability_key)
+
+
+def team_key(team):
+    """
+    Encoding of the team for battles. Empty slots are skipped because the pets
+    are moved forward at the start of the battle.
+
+    """
+    return tuple([pet_key(slot.pet) for slot in team if not slot.empty])
+
+#%%
@@ -4,6 +4,7 @@
 
 import json,zlib
 import sapai
+from sapai.keys import hash_key
 
 
 def compress(obj,minimal=False):
@@ -37,13 +38,14 @@ def decompress(compressed_str):
 
 def sapai_hash(obj):
     """
-    Fast method for hashing the object 
+    Fast method for hashing the object. Returns the unsigned 64-bit hash of the
+    key of the object, which only includes the same information as 
+    compress with minimal=True. 
     
     """
-    state = getattr(obj, "state", False)
-    if not state:
-        raise Exception("No state found for obj {}".format(obj))
-    raise Exception("I can't find faster way to do this... But it would be very nice.")
+    if not hasattr(obj, "key"):
+        raise Exception("No key found for obj {}".format(obj))
+    return hash_key(obj.key())
 
 
 def minimal_state(obj):
@@ -1,6 +1,5 @@
 
 import sys,inspect
-import itertools
 import numpy as np
 
 from sapai import pets
@@ -8,6 +7,8 @@ import sapai
 from sapai.data import data
 from sapai.tiers import pet_tier_lookup,pet_tier_lookup_std
 from sapai.foods import Food
+from sapai.targets import target_dict,get_effect_target
+from sapai.statuses import get_effect_damage,none_id,status_consumed_defend
 
 
 """
@@ -53,7 +54,10 @@ This module implements all effects in the game. API description is as follows:
 
 def get_effect_function(effect_kind):
     if type(effect_kind).__name__ == "Pet":
-        effect_kind = effect_kind.ability["effect"]["kind"]
+        record = effect_kind.ability_record
+        if record.func is not None:
+            return record.func
+        effect_kind = record.kind
     elif type(effect_kind).__name__ == "TeamSlot":
         effect_kind = effect_kind.pet.ability["effect"]["kind"]
     elif type(effect_kind) == str:
@@ -130,35 +134,31 @@ def get_target(apet,
     """
     if type(apet).__name__ == "Pet":
         effect = apet.ability["effect"]
+        record = apet.ability_record
     elif type(apet).__name__ == "Food":
         effect = apet.effect
+        record = None
     
     if len(teams) == 1:
         teams = [teams[0], []]
     
-    ### Logic switch because data-dictionary is not consistent
-    if "target" not in effect:
-        if "to" in effect:
-            target = effect["to"]
+    ### Targets of compiled abilities have been normalized at import. The 
+    ###   effect is not the compiled effect for the effects of AllOf. 
+    kind = None
+    if record is not None and record.effect is effect:
+        if get_from:
+            kind,n = record.from_target,record.from_n
         else:
+            kind,n = record.target,record.n
+    if kind is None:
+        if "target" not in effect and "to" not in effect:
             print(apet,apet_idx,teams,te,fixed_targets,get_from)
-            raise Exception("Target not found")
-    else:
-        target = effect["target"]
-
-    if get_from:
-        if "from" not in effect:
-            raise Exception("from not found in effect")
+        target = get_effect_target(effect, get_from)
+        kind = target["kind"]
+        if "n" in target:
+            n = target["n"]
         else:
-            target = effect["from"]
-    
-    if type(target) != dict:
-        raise Exception("This should not be possible")
-    kind = target["kind"]
-    if "n" in target:
-        n = target["n"]
-    else:
-        n = 1
+            n = 1
         
     if len(test_kind) != 0:
         kind = test_kind
@@ -171,339 +171,10 @@ def get_target(apet,
         oteam = teams[0]
     else:
         raise Exception("That's impossible")
-
-    ### Get possible indices for each team
-    fidx = []
-    for iter_idx,temp_slot in enumerate(fteam):
-        if not temp_slot.empty:
-            ### Skiped if health is less than 0
-            if temp_slot.pet.health > 0:
-                fidx.append(iter_idx)
-    oidx = []
-    for iter_idx,temp_slot in enumerate(oteam):
-        if not temp_slot.empty:
-            ### Skiped if health is less than 0
-            if temp_slot.pet.health > 0:
-                oidx.append(iter_idx)
-    
-    if kind == "AdjacentAnimals":
-        all_pets = []
-        fpet_slot_idx = []
-        ### First add opponent backward 
-        for temp_slot in oteam[::-1]:
-            all_pets.append(temp_slot)
-        ### Then friendly
-        for temp_slot in fteam:
-            fpet_slot_idx.append(len(all_pets))
-            all_pets.append(temp_slot)
-        apet_in_all = fpet_slot_idx[apet_idx[1]]
-        if (apet_in_all-1) > 0:
-            left_slot = all_pets[apet_in_all-1]
-        else:
-            left_slot = None
-        
-        if (apet_in_all+1) < len(all_pets):
-            right_slot = all_pets[apet_in_all+1]
-        else:
-            right_slot = None
-
-        ret_pets = []
-        for temp_slot in [left_slot,right_slot]:
-            if temp_slot == None:
-                continue
-            if temp_slot.empty:
-                continue
-            else:
-                ret_pets.append(temp_slot.pet)
-        return ret_pets,[ret_pets]
-    
-    elif kind == "AdjacentFriends":
-        all_pets = []
-        fpet_slot_idx = []
-        for temp_slot in fteam:
-            fpet_slot_idx.append(len(all_pets))
-            all_pets.append(temp_slot)
-        apet_in_all = fpet_slot_idx[apet_idx[1]]
-        if (apet_in_all-1) > 0:
-            left_slot = all_pets[apet_in_all-1]
-        else:
-            left_slot = None
-        
-        if (apet_in_all+1) < len(all_pets):
-            right_slot = all_pets[apet_in_all+1]
-        else:
-            right_slot = None
-            
-        ret_pets = []
-        for temp_slot in [left_slot,right_slot]:
-            if temp_slot == None:
-                continue
-            if temp_slot.empty:
-                continue
-            else:
-                ret_pets.append(temp_slot.pet)
-        return ret_pets,[ret_pets]
-    
-    elif kind == "All":
-        ret_pets = []
-        for temp_idx in fidx:
-            ret_pets.append(fteam[temp_idx].pet)
-        for temp_idx in oidx:
-            ret_pets.append(oteam[temp_idx].pet)
-        return ret_pets,[ret_pets]
-        
-    elif kind == "DifferentTierAnimals":
-        pet_tier_lookup = {1: [], 2: [], 3: [], 4: [], 5: [], 6:[]}
-        for temp_idx in fidx:
-            temp_tier = fteam[temp_idx].pet.tier
-            pet_tier_lookup[temp_tier].append(temp_idx)
-        
-        ### Build lookup of all possible pets
-        idx_list = []
-        for key,value in pet_tier_lookup.items():
-            if len(value) > 0:
-                idx_list.append(value)
-        grid = np.meshgrid(*idx_list)
-        ravel_grid = [x.ravel()  for x in grid]
-        all_idx = np.array(ravel_grid).T
-        all_possible = []
-        for temp_idx in all_idx:
-            temp_chosen = [fteam[x].pet for x in temp_idx]
-            all_possible.append(temp_chosen)
-        if len(all_possible) == 0:
-            return [],[]
-        ### Choose one to return for current 
-        choice_idx_range = np.arange(0,len(all_possible))
-        choice_idx = apet.rs.choice(choice_idx_range, (1,))[0]
-        ### Update internal state of random generator
-        apet.seed_state = apet.rs.get_state()
-        ret_pets = all_possible[choice_idx]
-        return ret_pets,all_possible
-    
-    elif kind == "EachEnemy":
-        ret_pets = []
-        for temp_idx in oidx:
-            ret_pets.append(oteam[temp_idx].pet)
-        return ret_pets,[ret_pets]
-    
-    elif kind == "EachFriend":
-        ret_pets = []
-        for temp_idx in fidx:
-            if temp_idx != apet_idx[1]:
-                ret_pets.append(fteam[temp_idx].pet)
-        return ret_pets,[ret_pets]
-    
-    elif kind == "EachShopAnimal":
-        shop = apet.shop
-        if shop == None:
-            return [],[]
-        else:
-            return shop.pets,[shop.pets]
-        
-    elif kind == "FirstEnemy":
-        if len(oidx) > 0:
-            return [oteam[oidx[0]].pet],[[oteam[oidx[0]].pet]]
-        else:
-            return [],[]
-    
-    elif kind == "FriendAhead":
-        chosen_idx = []
-        for temp_idx in fidx:
-            if temp_idx < apet_idx[1]:
-                chosen_idx.append(temp_idx)
-        ret_pets = []
-        for temp_idx in chosen_idx[::-1]:
-            ret_pets.append(fteam[temp_idx].pet)
-            if len(ret_pets) >= n:
-                break
-        return ret_pets,[ret_pets]
-        
-    elif kind == "FriendBehind":
-        chosen_idx = []
-        for temp_idx in fidx:
-            if temp_idx > apet_idx[1]:
-                chosen_idx.append(temp_idx)
-        ret_pets = []
-        for temp_idx in chosen_idx:
-            ret_pets.append(fteam[temp_idx].pet)
-            if len(ret_pets) >= n:
-                break
-        return ret_pets,[ret_pets]
-    
-    elif kind == "HighestHealthEnemy":
-        health_list = []
-        for temp_idx in oidx:
-            health_list.append(oteam[temp_idx].pet.health)
-        if len(health_list) > 0:
-            max_health = np.max(health_list)
-            choice_idx_range = np.where(np.array(health_list) == max_health)[0]
-            choice_idx = apet.rs.choice(choice_idx_range, (1,), replace=False)[0]
-            all_possible = [[oteam[oidx[x]].pet] for x in choice_idx_range]
-            ### Update internal state of random generator
-            apet.seed_state = apet.rs.get_state()
-            ### Dereference max_idx
-            return [oteam[oidx[choice_idx]].pet],all_possible
-        else:
-            return [],[]
-        
-    elif kind == "LastEnemy":
-        if len(oidx) > 0:
-            return [oteam[np.max(oidx)].pet],[[oteam[np.max(oidx)].pet]]
-        else:
-            return [],[]
     
-    elif kind == "LeftMostFriend":
-        max_idx = np.max(fidx)
-        return [fteam[max_idx].pet],[[fteam[max_idx].pet]]
-        
-    elif kind == "Level2And3Friends":
-        level_list = []
-        for temp_idx in fidx:
-            level_list.append(fteam[temp_idx].pet.level)
-        if len(level_list) > 0:
-            keep_idx = np.where(np.array(level_list) > 1)[0]
-            ret_pets = []
-            for temp_idx in keep_idx:
-                ### Dereference idx
-                temp_idx = fidx[temp_idx]
-                ret_pets.append(fteam[temp_idx].pet)
-            return ret_pets,[ret_pets]
-        else:
-            return [],[]
-    
-    elif kind == "LowestHealthEnemy":
-        health_list = []
-        for temp_idx in oidx:
-            health_list.append(oteam[temp_idx].pet.health)
-        if len(health_list) > 0:
-            min_health = np.min(health_list)
-            choice_idx_range = np.where(np.array(health_list) == min_health)[0]
-            choice_idx = apet.rs.choice(choice_idx_range, (1,), replace=False)[0]
-            all_possible = [[oteam[oidx[x]].pet] for x in choice_idx_range]
-            ### Update internal state of random generator
-            apet.seed_state = apet.rs.get_state()
-            ### Dereference max_idx
-            return [oteam[oidx[choice_idx]].pet],all_possible
-        else:
-            return [],[]
-    
-    elif kind == "RandomEnemy":
-        ret_pets = []
-        all_possible = []
-        if len(oidx) > 0:
-            if len(oidx) < n:
-                n = len(oidx)
-            all_idx = [x for x in itertools.combinations(oidx,n)]
-            all_possible = []
-            for temp_idx in all_idx:
-                temp_chosen = [oteam[x].pet for x in temp_idx]
-                all_possible.append(temp_chosen)
-            if len(all_possible) == 0:
-                return [],[]
-            crange = np.arange(0,len(all_possible))
-            cidx = apet.rs.choice(crange,(1,),replace=False)[0]
-            ### Update internal state of random generator
-            apet.seed_state = apet.rs.get_state()
-            ret_pets = all_possible[cidx]
-        return ret_pets,all_possible
-    
-    elif kind == "RandomFriend":
-        ret_pets = []
-        all_possible = []
-        if len(fidx) > 0:
-            if len(fidx) < n:
-                n = len(fidx)
-            keep_fidx = []
-            for temp_entry in fidx:
-                if temp_entry == apet_idx[1]:
-                    continue
-                keep_fidx.append(temp_entry)
-            fidx = keep_fidx
-            all_idx = [x for x in itertools.combinations(fidx,n)]
-            all_possible = []
-            for temp_idx in all_idx:
-                temp_chosen = [fteam[x].pet for x in temp_idx]
-                all_possible.append(temp_chosen)
-            if len(all_possible) == 0:
-                return [],[]
-            crange = np.arange(0,len(all_possible))
-            cidx = apet.rs.choice(crange,(1,),replace=False)[0]
-            ### Update internal state of random generator
-            apet.seed_state = apet.rs.get_state()
-            ret_pets = all_possible[cidx]
-        return ret_pets,all_possible
-        
-    elif kind == "RightMostFriend":
-        return [fteam[fidx[0]].pet],[[fteam[fidx[0]].pet]]
-    
-    elif kind == "Self":
-        return [apet],[[apet]]
-
-    elif kind == "StrongestFriend":
-        stat_list = []
-        for temp_idx in fidx:
-            temp_stats = fteam[temp_idx].pet.attack + fteam[temp_idx].pet.health
-            stat_list.append(temp_stats)
-        stat_list = np.array(stat_list)
-        max_stats = np.max(stat_list)
-        max_idx = np.where(stat_list == max_stats)[0]
-        all_possible = []
-        for temp_idx in max_idx:
-            all_possible.append(fteam[temp_idx].pet)
-        if len(all_possible) == 0:
-            return [],[]
-        choice = apet.rs.choice(max_idx,(1,),replace=False)[0]
-        ### Update internal state of random generator
-        apet.seed_state = apet.rs.get_state()
-        ret_pets = [fteam[choice].pet]
-        return ret_pets,all_possible
-
-    elif kind == "HighestHealthFriend":
-        health_list = []
-        for temp_idx in fidx:
-            health_list.append(fteam[temp_idx].pet.health)
-        if len(health_list) == 0:
-            return [],[]
-        max_health = np.max(health_list)
-        max_idx = np.where(health_list == max_health)[0]
-        all_possible = []
-        for temp_idx in max_idx:
-            all_possible.append(fteam[fidx[temp_idx]].pet)
-        choice = apet.rs.choice(max_idx,(1,),replace=False)[0]
-        ### Update internal state of random generator
-        apet.seed_state = apet.rs.get_state()
-        ret_pets = [fteam[fidx[choice]].pet]
-        return ret_pets,all_possible
-
-    
-    elif kind == "TriggeringEntity":
-        if te != None:
-            return [te],[[te]]
-        else:
-            return [],[]
-        
-    elif kind == "NonWeakEnemy":
-        possible = []
-        for temp_idx in oidx:
-            temp_pet = oteam[temp_idx].pet
-            if temp_pet.status == "status-weak":
-                continue
-            else:
-                possible.append([temp_pet])
-        if len(possible) == 0:
-            return [],[]
-        idx_range = np.arange(0,len(possible))
-        chosen_idx = apet.rs.choice(idx_range,(1,),replace=False)[0]
-        ### Update internal state of random generator
-        apet.seed_state = apet.rs.get_state()
-        return possible[chosen_idx],possible
-          
-    elif kind == "none":
-        ### No targets
-        return [],[]
-
-    else:
+    if kind not in target_dict:
         raise Exception("Target {} impelementation not found".format(kind))
+    return target_dict[kind](apet,apet_idx,fteam,oteam,n,te)
     
 
 def AllOf(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
@@ -549,16 +220,10 @@ def DealDamage(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
         else:
             raise Exception()
     for target_pet in target:
-        if target_pet.status == "status-melon-armor":
-            health_amount = max(0, health_amount - 20)
-            target_pet.status = "none"
-        elif target_pet.status == "status-garlic-armor":
-            health_amount = max(1, health_amount - 2)
-        elif target_pet.status == "status-coconut-shield":
-            health_amount = 0
-            target_pet.status = "none"
-        elif target_pet.status == "status-weak":
-            health_amount += 3
+        status = target_pet._status
+        health_amount = get_effect_damage(health_amount, status)
+        if status_consumed_defend[status]:
+            target_pet._status = none_id
     
         target_pet.hurt(health_amount)
     return target,possible
@@ -597,6 +262,8 @@ def Evolve(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
         possible = [fixed_targets]
     fteam,oteam = get_teams(apet_idx, teams)
     spet = pets.Pet(target[0].ability["effect"]["into"])
+    ### Evolved pet keeps the random state
+    spet.rs = target[0].rs
     try:
         fteam.remove(target[0])
     except Exception:
@@ -790,6 +457,8 @@ def RespawnPet(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
     target_slot_idx = np.max(empty_idx)
     target_team[target_slot_idx] = spet_name
     spet = target_team[target_slot_idx].pet
+    ### Summoned pet uses the random state of the pet that summoned it
+    spet.rs = apet.rs
     
     if "baseAttack" in apet.ability["effect"]:
         spet._attack = apet.ability["effect"]["baseAttack"]
@@ -801,7 +470,10 @@ def RespawnPet(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
     ### Move back forward
     target_team.move_forward()
     for temp_slot in target_team:
-        ### Make sure team is assigned correctly to all pets
+        ### Make sure team is assigned correctly to all pets. Empty slots 
+        ###   share empty_pet, which is never connected to a team.
+        if temp_slot.empty:
+            continue
         temp_slot.pet.team = target_team 
     
     return target,[target]
@@ -868,6 +540,8 @@ def SummonPet(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
         target_slot_idx = np.max(empty_idx)
         target_team[target_slot_idx] = spet_name
         spet = target_team[target_slot_idx].pet
+        ### Summoned pet uses the random state of the pet that summoned it
+        spet.rs = apet.rs
         
         if "withAttack" in apet.ability["effect"]:
             spet._attack = apet.ability["effect"]["withAttack"]
@@ -883,7 +557,10 @@ def SummonPet(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
     ### Move back forward
     target_team.move_forward()
     for temp_slot in target_team:
-        ### Make sure team is assigned correctly to all pets
+        ### Make sure team is assigned correctly to all pets. Empty slots 
+        ###   share empty_pet, which is never connected to a team.
+        if temp_slot.empty:
+            continue
         temp_slot.pet.team = target_team 
     
     return target,[target]
@@ -936,6 +613,8 @@ def SummonRandomPet(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
     target_slot_idx = np.max(empty_idx)
     fteam[target_slot_idx] = str(chosen)
     spet = fteam[target_slot_idx].pet
+    ### Summoned pet uses the random state of the pet that summoned it
+    spet.rs = apet.rs
     if "baseAttack" in apet.ability["effect"]:
         sattack = apet.ability["effect"]["baseAttack"]
     else:
@@ -954,6 +633,8 @@ def SummonRandomPet(apet,apet_idx,teams,te=None,te_idx=[],fixed_targets=[]):
     spet._health = shealth
     fteam.move_forward()
     for temp_slot in fteam:
+        if temp_slot.empty:
+            continue
         temp_slot.pet.team = fteam
     
     return [spet],[[x] for x in possible]
@@ -0,0 +1,226 @@
+#%%
+
+from statistics import NormalDist
+import numpy as np
+
+from sapai.data import data
+from sapai.battle import Battle
+
+
+### Phase in which each battle trigger is performed. Effects that are
+###   performed in the same phase are ordered by the pet priority.
+trigger_phase = {"StartOfBattle": "start",
+                 "BeforeAttack": "attack_before",
+                 "AfterAttack": "attack_after",
+                 "KnockOut": "knockout",
+                 "Faint": "hurt_and_faint",
+                 "Hurt": "hurt_and_faint",
+                 "Summoned": "hurt_and_faint"}
+
+### Targets that are chosen randomly, or randomly if there is a tie
+random_targets = {"RandomEnemy",
+                  "RandomFriend",
+                  "LowestHealthEnemy",
+                  "HighestHealthEnemy",
+                  "StrongestFriend",
+                  "HighestHealthFriend",
+                  "NonWeakEnemy",
+                  "DifferentTierAnimals"}
+
+### Effects that are chosen randomly
+random_effects = {"OneOf", "SummonRandomPet"}
+
+### Effects that change abilities during the battle. These are not analyzed
+###   and the battle is considered random.
+ability_effects = {"Swallow",
+                   "RepeatAbility",
+                   "TransferAbility",
+                   "GainAbility",
+                   "Evolve"}
+
+
+def check_deterministic(t0, t1):
+    """
+    Static analysis of the teams that returns True if the battle between t0
+    and t1 is guaranteed to have the same outcome every time.
+
+    The outcome of a battle can be random in two ways. First, an ability may
+    have a random effect or a random target. Second, ties in the pet priority
+    are broken randomly. The order of the effects is only relevant if two
+    pets have effects in the same phase and one of these effects does not
+    only modify the pet itself. The abilities of all pets that may be
+    summoned during the battle are also considered.
+
+    The analysis is conservative, therefore, False does not mean that the
+    outcome of the battle is random.
+
+    """
+    ### Number of abilities and number of abilities that affect other pets
+    ###   for each phase
+    nabilities = {x: 0 for x in trigger_phase.values()}
+    nother = {x: 0 for x in trigger_phase.values()}
+
+    ability_list = []
+    for team in [t0,t1]:
+        for slot in team:
+            if slot.empty:
+                continue
+            pet = slot.pet
+            ability_list.append(pet.ability)
+            status_ability = data["statuses"].get(pet.status, {}).get(
+                "ability", None)
+            if status_ability is not None:
+                ability_list.append(status_ability)
+
+    ### Abilities of summoned pets are counted twice because the same pet may
+    ###   be summoned multiple times
+    summoned = set()
+    while len(ability_list) > 0:
+        ability = ability_list.pop()
+        trigger = ability.get("trigger", "none")
+        if trigger not in trigger_phase:
+            continue
+        effect = ability["effect"]
+        if check_random_effect(effect):
+            return False
+        phase = trigger_phase[trigger]
+        nabilities[phase] += 1
+        if not check_self_effect(effect):
+            nother[phase] += 1
+        for name in get_summoned(effect):
+            if name in summoned:
+                continue
+            summoned.add(name)
+            fd = data["pets"][name]
+            for level in range(1,4):
+                ability_str = "level{}Ability".format(level)
+                if ability_str in fd:
+                    ability_list += [fd[ability_str], fd[ability_str]]
+
+    for phase in nabilities:
+        if nabilities[phase] > 1 and nother[phase] > 0:
+            return False
+    return True
+
+
+def check_random_effect(effect):
+    """ Returns True if the effect may be random or changes abilities """
+    kind = effect["kind"]
+    if kind in random_effects:
+        return True
+    if kind in ability_effects:
+        return True
+    for key in ["target", "to", "from"]:
+        if key in effect:
+            if effect[key]["kind"] in random_targets:
+                return True
+    for temp_effect in effect.get("effects", []):
+        if check_random_effect(temp_effect):
+            return True
+    return False
+
+
+def check_self_effect(effect):
+    """ Returns True if the effect only modifies the pet itself """
+    kind = effect["kind"]
+    if kind == "AllOf":
+        for temp_effect in effect["effects"]:
+            if not check_self_effect(temp_effect):
+                return False
+        return True
+    if kind == "ModifyStats":
+        return effect["target"]["kind"] == "Self"
+    if kind == "ApplyStatus":
+        return effect["to"]["kind"] == "Self"
+    return False
+
+
+def get_summoned(effect):
+    """ Returns the names of the pets that may be summoned by the effect """
+    if effect["kind"] == "SummonPet":
+        return [effect["pet"]]
+    names = []
+    for temp_effect in effect.get("effects", []):
+        names += get_summoned(temp_effect)
+    return names
+
+
+def estimate(t0, t1, nsamples=100, rng=None):
+    """
+    Estimates the probabilities of t0 win, t1 win, and draw. If the battle is
+    deterministic, as determined by check_deterministic, only one battle is
+    performed. Otherwise, nsamples battles are performed. If rng is provided,
+    a single Generator is used for all battles.
+
+    """
+    if rng is not None:
+        rng = np.random.default_rng(rng)
+    probs = np.zeros((3,))
+    if check_deterministic(t0,t1):
+        probs[Battle(t0,t1,history=False,rng=rng).battle()] = 1
+        return probs
+    for _ in range(nsamples):
+        probs[Battle(t0,t1,history=False,rng=rng).battle()] += 1
+    return probs/nsamples
+
+
+def sequential_estimate(t0,
+                        t1,
+                        width=0.1,
+                        confidence=0.95,
+                        min_samples=10,
+                        max_samples=1000,
+                        rng=None):
+    """
+    Estimates the probabilities of t0 win, t1 win, and draw by performing
+    battles until the confidence intervals of all three probabilities are
+    smaller than width, or until max_samples battles have been performed.
+    The Wilson score interval is used, which stays accurate for lopsided
+    battles where one outcome is very likely. If the battle is deterministic,
+    as determined by check_deterministic, only one battle is performed. If 
+    rng is provided, a single Generator is used for all battles.
+
+    Returns dictionary with the probabilities, the lower and upper bounds of
+    the confidence intervals, and the number of battles performed.
+
+    """
+    if rng is not None:
+        rng = np.random.default_rng(rng)
+    counts = np.zeros((3,))
+    if check_deterministic(t0,t1):
+        counts[Battle(t0,t1,history=False,rng=rng).battle()] = 1
+        return {"probs": counts,
+                "lower": counts.copy(),
+                "upper": counts.copy(),
+                "nsamples": 1}
+
+    z = NormalDist().inv_cdf(0.5+confidence/2)
+    nsamples = 0
+    while True:
+        counts[Battle(t0,t1,history=False,rng=rng).battle()] += 1
+        nsamples += 1
+        lower,upper = wilson_interval(counts, nsamples, z)
+        if nsamples >= max_samples:
+            break
+        if nsamples >= min_samples and np.max(upper-lower) <= width:
+            break
+
+    return {"probs": counts/nsamples,
+            "lower": lower,
+            "upper": upper,
+            "nsamples": nsamples}
+
+
+def wilson_interval(counts, n, z):
+    """
+    Wilson score interval for the probabilities given the counts of each
+    outcome in n samples
+    
+    """
+    p = counts/n
+    denom = 1+z**2/n
+    center = (p+z**2/(2*n))/denom
+    half = z*np.sqrt(p*(1-p)/n+z**2/(4*n**2))/denom
+    return np.maximum(center-half,0),np.minimum(center+half,1)
+
+#%%
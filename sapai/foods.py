@@ -1,14 +1,19 @@
 
 
 #%%
-import numpy as np
 
 from sapai.data import data
-from sapai.rand import MockRandomState
+from sapai.rand import get_random_state,get_seed_state
+from sapai.keys import get_name_id
 
 #%%
 
 class Food():
+    __slots__ = ("eaten", "shop", "player", "seed_state", "rs", "attack", 
+                 "health", "base_attack", "base_health", 
+                 "apply_until_end_of_battle", "status", "effect", "fd", 
+                 "name", "cost")
+    
     def __init__(self, 
                  name="food-none", 
                  shop=None, 
@@ -21,75 +26,54 @@ class Food():
         if len(name) != 0:
             if not name.startswith("food-"):
                 name = "food-{}".format(name)
-            
+        
+        ### Attributes that only depend on the kind of food are read from the
+        ###   prototype instead of the data-dictionary
+        prototype = food_prototypes.get(name, None)
+        if prototype is None:
+            prototype = build_food_prototype(name)
+        (self.name, self.fd, self.cost, self.effect, self.attack, 
+         self.health, self.base_attack, self.base_health, self.status, 
+         self.apply_until_end_of_battle) = prototype
+        
         self.eaten = False
         self.shop = shop
-        
+        self.player = None
         self.seed_state = seed_state
-        if self.seed_state != None:
-            self.rs = np.random.RandomState()
-            self.rs.set_state(self.seed_state)
-        else:
-            ### Otherwise, set use 
-            self.rs = MockRandomState()
-
-        self.attack = 0
-        self.health = 0
-        self.base_attack = 0
-        self.base_health = 0
-        self.apply_until_end_of_battle = False
-        self.status = "none"
-        self.effect = "none"
-        self.fd = {}
-            
-        self.name = name
-        if name not in data["foods"]:
-            raise Exception("Food {} not found".format(name))
-        
-        self.cost = 3
-        item = data["foods"][name]
-        if "cost" in item:
-            self.cost = item["cost"]
-        
-        fd = item["ability"]
-        self.fd = fd
-        
-        self.attack = 0
-        self.health = 0
-        self.effect = fd["effect"]
-        if "attackAmount" in fd["effect"]:
-            self.attack = fd["effect"]["attackAmount"]
-            self.base_attack = fd["effect"]["attackAmount"]
-        if "healthAmount" in fd["effect"]:
-            self.health = fd["effect"]["healthAmount"]
-            self.base_health = fd["effect"]["healthAmount"]
-        if "status" in fd["effect"]:
-            self.status = fd["effect"]["status"]
-        if "untilEndOfBattle" in fd["effect"] and fd["effect"]["untilEndOfBattle"] is True:
-            self.apply_until_end_of_battle = True
+        self.rs = get_random_state(seed_state)
             
     
     def copy(self):
-        copy_food = Food(self.name, self.shop)
-        for key,value in self.__dict__.items():
-            ### Although this approach will copy the internal dictionaries by 
-            ###   reference rather than copy by value, these dictionaries will 
-            ###   never be modified anyways. 
-            ### All integers and strings are copied by value automatically with
-            ###   Python, therefore, this achieves the correct behavior
-            copy_food.__dict__[key] = value
+        ### __init__ is skipped because all attributes are overwritten anyways
+        copy_food = Food.__new__(Food)
+        ### Although this approach will copy the internal dictionaries by 
+        ###   reference rather than copy by value, these dictionaries will 
+        ###   never be modified anyways. 
+        ### All integers and strings are copied by value automatically with
+        ###   Python, therefore, this achieves the correct behavior
+        for key in Food.__slots__:
+            setattr(copy_food, key, getattr(self, key))
         return copy_food
     
     
+    def key(self):
+        """ Canonical key of the gameplay-relevant attributes of the food """
+        return (get_name_id(self.name),
+                self.attack,
+                self.health,
+                int(self.apply_until_end_of_battle))
+    
+    
+    def equals(self, other):
+        """ Returns True if the other food has identical gameplay attributes """
+        return type(other) == Food and self.key() == other.key()
+    
+    
     @property
     def state(self):
         #### Ensure that state can be JSON serialized
         if getattr(self, "rs", False):
-            if type(self.rs).__name__ == "MockRandomState":
-                seed_state = None
-            else:
-                seed_state = list(self.rs.get_state())
-                seed_state[1] = seed_state[1].tolist()
+            seed_state = get_seed_state(self.rs)
         else:
             seed_state = None
         state_dict = {
@@ -115,8 +99,7 @@ class Food():
         if "seed_state" in state:
             if state["seed_state"] != None:
                 food.seed_state = state["seed_state"]
-                food.rs = np.random.RandomState()
-                food.rs.set_state(state["seed_state"])
+                food.rs = get_random_state(food.seed_state)
         return food
     
         
@@ -124,5 +107,53 @@ class Food():
         return "< {} {}-{} {} >".format(
             self.name, self.attack, self.health, self.status)
 
+
+
+### Prototypes of each food that are built on first use. A prototype is the
+###   tuple (name, fd, cost, effect, attack, health, base_attack, 
+###   base_health, status, apply_until_end_of_battle) of the attributes of a 
+###   new Food that only depend on the kind of food. 
+food_prototypes = {}
+
+
+def build_food_prototype(name):
+    """
+    Builds and stores the prototype of the food, which holds the attributes
+    of a new Food that only depend on the kind of food
+    
+    """
+    if name not in data["foods"]:
+        raise Exception("Food {} not found".format(name))
+    
+    cost = 3
+    item = data["foods"][name]
+    if "cost" in item:
+        cost = item["cost"]
+    
+    fd = item["ability"]
+    effect = fd["effect"]
+    attack = 0
+    health = 0
+    status = "none"
+    apply_until_end_of_battle = False
+    if "attackAmount" in effect:
+        attack = effect["attackAmount"]
+    if "healthAmount" in effect:
+        health = effect["healthAmount"]
+    if "status" in effect:
+        status = effect["status"]
+    if "untilEndOfBattle" in effect and effect["untilEndOfBattle"] is True:
+        apply_until_end_of_battle = True
+    
+    prototype = (name, fd, cost, effect, attack, health, attack, health, 
+                 status, apply_until_end_of_battle)
+    food_prototypes[name] = prototype
+    return prototype
+
+
+### Shared Food of empty shop slots. Only foods that are not empty are ever
+###   modified or connected to a shop or player. 
+empty_food = Food()
+
         
 # %%
@@ -0,0 +1,93 @@
+
+
+from sapai.statuses import status_list
+
+
+"""
+The battle_history stores compact snapshots of the pets instead of their
+string representations. Building the strings for every event is a large
+fraction of the cost of a battle, therefore, they are only built when the
+history is formatted with format_history, such as by graph_battle.
+
+Entries of the battle_history are as follows:
+
+    init: [team_snapshot, team_snapshot]
+    phase_move_start/phase_move_end: [[team_snapshot, team_snapshot],
+                                      [team_snapshot, team_snapshot]]
+        Order of the slots before and after the teams have been moved
+    other phases: list of events
+        (effect name, (team_idx, pet_idx), pet_snapshot, target_snapshots)
+
+A pet snapshot is the tuple (name, attack, health, status id, level,
+experience) at the time of the event. A team snapshot is the tuple of the pet
+snapshots of each slot. Targets that are not pets are stored as is.
+
+"""
+
+
+def pet_snapshot(pet):
+    """ Returns the compact snapshot of the current stats of the pet """
+    if type(pet).__name__ != "Pet":
+        return pet
+    return (pet.name, pet.attack, pet.health, pet._status,
+            pet.level, pet.experience)
+
+
+def team_snapshot(team):
+    """ Returns the compact snapshot of every slot of the team """
+    return tuple([pet_snapshot(x._pet) for x in team])
+
+
+def targets_snapshot(targets):
+    """ Returns the list of snapshots of the targets """
+    return [pet_snapshot(x) for x in targets]
+
+
+def pet_snapshot_str(snapshot):
+    """ Returns the same string as Pet.__repr__ for the snapshot """
+    if type(snapshot) != tuple:
+        return str(snapshot)
+    name,attack,health,status,level,experience = snapshot
+    return "< {} {}-{} {} {}-{} >".format(
+        name, attack, health, status_list[status], level, experience)
+
+
+def slot_snapshot_str(snapshot):
+    """ Returns the same string as TeamSlot.__repr__ for the snapshot """
+    if snapshot[0] == "pet-none":
+        return "< Slot EMPTY >"
+    return "< Slot {} >".format(pet_snapshot_str(snapshot)[2:-2])
+
+
+def format_event(event):
+    """ Returns the event with the snapshots replaced by their strings """
+    effect_name,idx,snapshot,targets = event
+    return (effect_name,
+            idx,
+            pet_snapshot_str(snapshot),
+            [pet_snapshot_str(x) for x in targets])
+
+
+def format_history(battle_history):
+    """
+    Returns a copy of the battle_history where all snapshots have been
+    replaced by their human-readable strings.
+
+    """
+    ret_history = {}
+    for turn_name,phase_dict in battle_history.items():
+        if turn_name == "init":
+            ret_history[turn_name] = [[slot_snapshot_str(x) for x in team]
+                                      for team in phase_dict]
+            continue
+        ret_phase_dict = {}
+        for phase_name,phase_entry in phase_dict.items():
+            if phase_name.startswith("phase_move"):
+                ret_phase_dict[phase_name] = [
+                    [[slot_snapshot_str(x) for x in team] for team in order]
+                    for order in phase_entry]
+            else:
+                ret_phase_dict[phase_name] = [format_event(x)
+                                              for x in phase_entry]
+        ret_history[turn_name] = ret_phase_dict
+    return ret_history
@@ -0,0 +1,47 @@
+
+
+import zlib
+from sapai.data import data
+
+
+"""
+Keys are canonical encodings of the gameplay-relevant attributes of Pets,
+Foods, Teams, Shops and Players. They are tuples built only from integers,
+such that they are much faster to build and compare than the compressed
+states and such that they can be used directly for dicts and sets. Random
+states, action histories and connections to other objects are not part of
+the keys, identical to compress with minimal=True.
+
+Names are interned as integer ids. Overridden abilities are encoded with the
+crc32 of their string. Therefore, keys and their 64-bit hashes from hash_key
+are identical between Python processes.
+
+"""
+
+name_list = (["pet-none"]+[x for x in data["pets"]]+
+             ["food-none"]+[x for x in data["foods"]])
+name_idx = {x: iter_idx for iter_idx,x in enumerate(name_list)}
+pack_idx = {"StandardPack": 0, "ExpansionPack1": 1}
+lf_winner_idx = {None: 0, False: 1, True: 2}
+hash_mask = (1 << 64) - 1
+
+
+def get_name_id(name):
+    """ Returns the interned id of the name of the pet or food """
+    name_id = name_idx.get(name)
+    if name_id is None:
+        ### Names that are not in data use ids above all interned ids
+        name_id = len(name_list)+zlib.crc32(name.encode())
+    return name_id
+
+
+def get_ability_id(pet):
+    """ Returns the id of the overridden ability of the pet, 0 if none """
+    if not pet.override_ability:
+        return 0
+    return zlib.crc32(str(pet.override_ability_dict).encode())+1
+
+
+def hash_key(key):
+    """ Returns the unsigned 64-bit hash of the key """
+    return hash(key) & hash_mask
@@ -2,11 +2,13 @@
 
 #%%
 from random import seed
-import numpy as np
 from sapai.data import data
 from sapai.effects import get_effect_function,RespawnPet,SummonPet,SummonRandomPet
 from sapai.tiers import pet_tier_lookup,pet_tier_lookup_std
-from sapai.rand import MockRandomState
+from sapai.rand import get_random_state,get_seed_state
+from sapai.abilities import Ability,get_ability
+from sapai.statuses import status_list,status_idx
+from sapai.keys import get_name_id,get_ability_id
 
 #%%
 
@@ -14,7 +16,18 @@ class Pet():
     """
     Pet class defines all properties and triggers for Pets during gameplay
     
+    Pets use __slots__ instead of a __dict__ because very large numbers of 
+    pets are held by searches over Player states. level and status are 
+    properties that are stored as _level and _status. 
+    
     """
+    __slots__ = ("seed_state", "rs", "eaten", "shop", "team", "player",
+                 "ability_counter", "name", "fd", "override_ability",
+                 "override_ability_dict", "_override_record", "tier",
+                 "_attack", "_health", "_until_end_of_battle_attack_buff",
+                 "_until_end_of_battle_health_buff", "_hurt", "_status",
+                 "_level", "_ability", "experience", "fattack", "fhealth")
+    
     def __init__(self, 
                  name="pet-none", 
                  shop=None, 
@@ -25,14 +38,17 @@ class Pet():
         if len(name) != 0:
             if not name.startswith("pet-"):
                 name = "pet-{}".format(name)
+        
+        ### Attributes that only depend on the species are read from the 
+        ###   prototype of the species instead of the data-dictionary
+        prototype = pet_prototypes.get(name, None)
+        if prototype is None:
+            prototype = build_pet_prototype(name)
+        (self.name, self.fd, self.tier, self._attack, self._health, 
+         self._status, self._ability) = prototype
+        
         self.seed_state = seed_state
-        if self.seed_state != None:
-            self.rs = np.random.RandomState()
-            self.rs.set_state(self.seed_state)
-        else:
-            ### Otherwise, set use 
-            self.rs = MockRandomState()
-      
+        self.rs = get_random_state(seed_state)
         self.eaten = False
         self.shop = shop
         self.team = team
@@ -40,29 +56,20 @@ class Pet():
         
         ### Used only for goat
         self.ability_counter = 0
-            
-        self.name = name
-        if name not in data["pets"]:
-            raise Exception("Pet {} not found".format(name))
-        fd = data["pets"][name]
-        self.fd = fd
         self.override_ability = False
         self.override_ability_dict = {}
-        self.tier = data["pets"][name]["tier"]
+        self._override_record = None
         
-        ### Overall stats that should be brought into a battle
-        self._attack = fd["baseAttack"]
-        self._health = fd["baseHealth"]
-
         # For tracking buffs that only last until the end of battle
         self._until_end_of_battle_attack_buff = 0
         self._until_end_of_battle_health_buff = 0
         self._hurt = 0
-        self.status = "none"
-        if "status" in self.fd:
-            self.status = self.fd["status"]
+        ### Stats at the start of the battle, see init_battle
+        self.fattack = 0
+        self.fhealth = 0
         
-        self.level = 1
+        ### Ability of level 1 is already stored in the prototype
+        self._level = 1
         self.experience = 0
         
         #### Add pet to team if not already present
@@ -101,14 +108,47 @@ class Pet():
         self._health -= value
         self._hurt += 1
     
+    @property
+    def status(self):
+        ### Stored as the interned status id, see sapai.statuses
+        return status_list[self._status]
+    
+    
+    @status.setter
+    def status(self, value):
+        self._status = status_idx[value]
+    
+    
+    @property
+    def level(self):
+        return self._level
+    
+    
+    @level.setter
+    def level(self, value):
+        ### Compiled ability is looked up only when the level changes
+        self._level = value
+        self._ability = get_ability(self.name, value)
+    
+    
     @property
     def ability(self):
         if self.override_ability:
             return self.override_ability_dict
-        if "level{}Ability".format(self.level) in self.fd:
-            return self.fd["level{}Ability".format(self.level)]
-        else:
-            return empty_ability
+        return self._ability.ability
+    
+    
+    @property
+    def ability_record(self):
+        """ Compiled Ability of the pet that is used for checking triggers """
+        if self.override_ability:
+            record = self._override_record
+            if record is None or \
+                    record.ability is not self.override_ability_dict:
+                record = Ability(self.override_ability_dict)
+                self._override_record = record
+            return record
+        return self._ability
     
     
     def set_ability(self, ability_dict):
@@ -194,7 +234,8 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "StartOfTurn":
+        record = self.ability_record
+        if record.trigger != "StartOfTurn":
             return activated,targets,possible
         
         func = get_effect_function(self)
@@ -241,7 +282,8 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "Sell":
+        record = self.ability_record
+        if record.trigger != "Sell":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Pet":
@@ -255,12 +297,12 @@ class Pet():
             self.team.remove(trigger)
         
         ### Check if self has been sold is important
-        if self.ability["triggeredBy"]["kind"] == "Self":
+        if record.triggered_by == "Self":
             if trigger != self:
                 return activated,targets,possible
             
         ### Check if not selling self is important, only for shrimp
-        if self.ability["triggeredBy"]["kind"] == "EachFriend":
+        if record.triggered_by == "EachFriend":
             if trigger == self:
                 return activated,targets,possible
         
@@ -281,14 +323,15 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "EatsShopFood":
+        record = self.ability_record
+        if record.trigger != "EatsShopFood":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Pet":
             raise Exception("Buy food must input pet that ate as trigger")
         
         ### Check if food has been bought for self is important
-        if self.ability["triggeredBy"]["kind"] == "Self":
+        if record.triggered_by == "Self":
             if trigger != self:
                 return activated,targets,possible
 
@@ -311,7 +354,8 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "BuyFood":
+        record = self.ability_record
+        if record.trigger != "BuyFood":
             return activated,targets,possible
 
         func = get_effect_function(self)
@@ -333,23 +377,24 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] not in ["Buy", "BuyAfterLoss", "BuyTier1Animal"]:
+        record = self.ability_record
+        if record.trigger not in ["Buy", "BuyAfterLoss", "BuyTier1Animal"]:
             return activated,targets,possible
         
         if type(trigger).__name__ != "Pet":
             raise Exception("Buy food must input food target as triggered")
         
         ### Behavior for bought self and friend
-        if self.ability["trigger"] == "Buy":
-            if self.ability["triggeredBy"]["kind"] == "Self":
+        if record.trigger == "Buy":
+            if record.triggered_by == "Self":
                 if trigger != self:
                     return activated,targets,possible
-            elif self.ability["triggeredBy"]["kind"] == "Player":
+            elif record.triggered_by == "Player":
                 ### Behavior for kind=self and kind=player is actually the 
                 ###   same and any distinction is unnecessary
                 if trigger != self:
                     return activated,targets,possible
-            elif self.ability["triggeredBy"]["kind"] == "EachFriend":
+            elif record.triggered_by == "EachFriend":
                 ### If trigger is EachFriend, then the trigger cannot actually
                 ###   be self
                 if trigger == self:
@@ -358,19 +403,19 @@ class Pet():
                 raise Exception("Ability unrecognized for {}".format(self))
         
         ### Behavior for BuyTier1Animal
-        if self.ability["trigger"] == "BuyTier1Animal":
+        if record.trigger == "BuyTier1Animal":
             if trigger.name not in pet_tier_lookup[1]:
                 return activated,targets,possible
         
         ### Behavior for BuyAfterLoss
-        if self.ability["trigger"] == "BuyAfterLoss":
+        if record.trigger == "BuyAfterLoss":
             if self.player == None:
                 return activated,targets,possible
             if self.player.lf_winner != False:
                 return activated,targets,possible
             
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -393,7 +438,8 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "Summoned":
+        record = self.ability_record
+        if record.trigger != "Summoned":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Pet":
@@ -403,8 +449,8 @@ class Pet():
             ### Do not activate for summoning self
             return activated,targets,possible
         
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -429,14 +475,15 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "LevelUp":
+        record = self.ability_record
+        if record.trigger != "LevelUp":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Pet":
             raise Exception("Trigger must be a Pet")
         
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -461,11 +508,12 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if not self.ability["trigger"].startswith("EndOfTurn"):
+        record = self.ability_record
+        if not record.trigger.startswith("EndOfTurn"):
             return activated,targets,possible
         
         ### Check gold for puppy and tyrannosaurus
-        if self.ability["trigger"] == "EndOfTurnWith3PlusGold":
+        if record.trigger == "EndOfTurnWith3PlusGold":
             if self.player != None:
                 if self.player.gold >= 3:
                     pass
@@ -474,26 +522,26 @@ class Pet():
             else:
                 return activated,targets,possible
         ### Check for bison
-        elif self.ability["trigger"] == "EndOfTurnWithLvl3Friend":
+        elif record.trigger == "EndOfTurnWithLvl3Friend":
             if self.team != None:
                 if not self.team.check_lvl3():
                     return activated,targets,possible
             else:
                 return activated,targets,possible
         ### Check for llama
-        elif self.ability["trigger"] == "EndOfTurnWith4OrLessAnimals":
+        elif record.trigger == "EndOfTurnWith4OrLessAnimals":
             if self.team != None:
                 if len(self.team) > 4:
                     return activated,targets,possible
             else:
                 return activated,targets,possible
         else:
-            if self.ability["trigger"] != "EndOfTurn":
+            if record.trigger != "EndOfTurn":
                 raise Exception("Unrecognized trigger {}"
-                                .format(self.ability["trigger"]))
+                                .format(record.trigger))
                 
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -518,7 +566,8 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "Faint":
+        record = self.ability_record
+        if record.trigger != "Faint":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Pet":
@@ -527,17 +576,17 @@ class Pet():
         if len(te_idx) == 0:
             raise Exception("Index of triggering entity must be input")
 
-        if self.ability["triggeredBy"]["kind"] == "Self":
+        if record.triggered_by == "Self":
             if trigger != self:
                 return activated,targets,possible
-        elif self.ability["triggeredBy"]["kind"] == "FriendAhead":
+        elif record.triggered_by == "FriendAhead":
             pet_ahead = self.team.get_ahead(self, n=1)
             if len(pet_ahead) == 0:
                 return activated,targets,possible
             pet_ahead = pet_ahead[0]
             if trigger != pet_ahead:
                 return activated,targets,possible
-        elif self.ability["triggeredBy"]["kind"] == "EachFriend":
+        elif record.triggered_by == "EachFriend":
             if trigger == self:
                 ### Only time this doesn't activate is if it self triggered
                 return activated,targets,possible
@@ -550,8 +599,8 @@ class Pet():
                 ### Do not activate if another zombie-fly faints
                 return activated,targets,possible
             
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -591,14 +640,15 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "StartOfBattle":
+        record = self.ability_record
+        if record.trigger != "StartOfBattle":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Team":
             raise Exception("Trigger must be a Team")
         
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -623,14 +673,15 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "BeforeAttack":
+        record = self.ability_record
+        if record.trigger != "BeforeAttack":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Team":
             raise Exception("Trigger must be a Team")
         
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -656,13 +707,14 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "AfterAttack":
+        record = self.ability_record
+        if record.trigger != "AfterAttack":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Team":
             raise Exception("Trigger must be a Team")
         
-        if self.ability["triggeredBy"]["kind"] != "FriendAhead":
+        if record.triggered_by != "FriendAhead":
             raise Exception(
                 "Only triggeredBy FriendAhead implemented for after_attack_trigger")
         
@@ -674,8 +726,8 @@ class Pet():
         if self.team.index(slot_ahead[0]) != 0:
             return activated,targets,possible
         
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -708,18 +760,19 @@ class Pet():
         activated = False
         targets = []
         possible = []        
+        record = self.ability_record
         if self._hurt == 0:
             raise Exception("Called hurt trigger on pet that was not hurt")
         else:
             self._hurt -= 1
 
-        if self.ability["trigger"] != "Hurt":
+        if record.trigger != "Hurt":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Team":
             raise Exception("Trigger must be a Team")
         
-        if self.ability["triggeredBy"]["kind"] == "Self":
+        if record.triggered_by == "Self":
             pass
         else:
             raise Exception("Only Self trigger available for hurt_trigger")
@@ -728,8 +781,8 @@ class Pet():
         if self._health <= 0:
             return activated,targets,possible
             
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -758,7 +811,8 @@ class Pet():
         activated = False
         targets = []
         possible = []
-        if self.ability["trigger"] != "KnockOut":
+        record = self.ability_record
+        if record.trigger != "KnockOut":
             return activated,targets,possible
         
         if type(trigger).__name__ != "Team":
@@ -768,8 +822,8 @@ class Pet():
         if self._health <= 0:
             return activated,targets,possible
         
-        if "maxTriggers" in self.ability:
-            if self.ability_counter >= self.ability["maxTriggers"]:
+        if record.max_triggers is not None:
+            if self.ability_counter >= record.max_triggers:
                 return activated,targets,possible
             else:
                 self.ability_counter += 1
@@ -792,17 +846,43 @@ class Pet():
         
         
     def copy(self):
-        copy_pet = Pet(self.name, self.shop,seed_state=self.seed_state)
-        for key,value in self.__dict__.items():
-            ### Although this approach will copy the internal dictionaries by 
-            ###   reference rather than copy by value, these dictionaries will 
-            ###   never be modified anyways. 
-            ### All integers and strings are copied by value automatically with
-            ###   Python, therefore, this achieves the correct behavior
-            copy_pet.__dict__[key] = value
+        ### __init__ is skipped because all attributes are overwritten anyways.
+        ###   This avoids the data lookup and the random state restore.
+        copy_pet = Pet.__new__(Pet)
+        ### Although this approach will copy the internal dictionaries by 
+        ###   reference rather than copy by value, these dictionaries will 
+        ###   never be modified anyways. 
+        ### All integers and strings are copied by value automatically with
+        ###   Python, therefore, this achieves the correct behavior
+        for key in Pet.__slots__:
+            setattr(copy_pet, key, getattr(self, key))
         return copy_pet
     
     
+    def key(self):
+        """
+        Canonical key of the gameplay-relevant attributes of the pet. __eq__
+        is not overridden because Teams and Shops find pets by identity.
+        
+        """
+        return (get_name_id(self.name),
+                self._attack, 
+                self._health, 
+                self._until_end_of_battle_attack_buff,
+                self._until_end_of_battle_health_buff,
+                self._status, 
+                self._level, 
+                self.experience, 
+                self._hurt, 
+                self.ability_counter,
+                get_ability_id(self))
+    
+    
+    def equals(self, other):
+        """ Returns True if the other pet has identical gameplay attributes """
+        return type(other) == Pet and self.key() == other.key()
+    
+    
     @property
     def state(self):
         #### Cannot get state for attached objects such as shop, team, or player
@@ -811,11 +891,7 @@ class Pet():
         
         #### Ensure that state can be JSON serialized
         if getattr(self, "rs", False):
-            if type(self.rs).__name__ == "MockRandomState":
-                seed_state = None
-            else:
-                seed_state = list(self.rs.get_state())
-                seed_state[1] = seed_state[1].tolist()
+            seed_state = get_seed_state(self.rs)
         else:
             seed_state = None
         
@@ -847,7 +923,6 @@ class Pet():
         name = state["name"]
         ### Initialize and reset defaults by hand
         pet = cls(name)
-        pet.store = None
         pet.team = None
         pet.player = None
 
@@ -867,13 +942,43 @@ class Pet():
         if "seed_state" in state:
             if state["seed_state"] != None:
                 pet.seed_state = state["seed_state"]
-                pet.rs = np.random.RandomState()
-                pet.rs.set_state(pet.seed_state)
+                pet.rs = get_random_state(pet.seed_state)
             
         return pet
 
 
 
+### Prototypes of each species that are built on first use. A prototype is 
+###   the tuple (name, fd, tier, attack, health, status id, ability) of the 
+###   attributes of a new Pet that only depend on the species. 
+pet_prototypes = {}
+
+
+def build_pet_prototype(name):
+    """
+    Builds and stores the prototype of the species, which holds the 
+    attributes of a new Pet that only depend on the species
+    
+    """
+    if name not in data["pets"]:
+        raise Exception("Pet {} not found".format(name))
+    fd = data["pets"][name]
+    
+    status = "none"
+    if "status" in fd:
+        status = fd["status"]
+    
+    prototype = (name, fd, fd["tier"], fd["baseAttack"], fd["baseHealth"],
+                 status_idx[status], get_ability(name, 1))
+    pet_prototypes[name] = prototype
+    return prototype
+
+
+### Shared Pet of empty slots. Only pets that are not empty are ever modified
+###   or connected to a team, shop, or player. 
+empty_pet = Pet()
+
+
 def tiger_func(func, te_fainted, *args):
     ### Check behind for tiger
     apet = args[0]
@@ -938,32 +1043,4 @@ def tiger_func(func, te_fainted, *args):
     
 
 
-empty_ability = {'description': 'none',
- 'trigger': 'none',
- 'triggeredBy': {'kind': 'none', 'n': 'none'},
- 'effect': {'kind': 'none',
-  'attackAmount': 'none',
-  'healthAmount': 'none',
-  'target': {'kind': 'none', 'n': 'none', 'includingFuture': 'none'},
-  'untilEndOfBattle': 'none',
-  'pet': 'none',
-  'withAttack': 'none',
-  'withHealth': 'none',
-  'team': 'none',
-  'amount': 'none',
-  'status': 'none',
-  'to': {'kind': 'none', 'n': 'none'},
-  'copyAttack': 'none',
-  'copyHealth': 'none',
-  'from': {'kind': 'none', 'n': 'none'},
-  'effects': 'none',
-  'tier': 'none',
-  'baseAttack': 'none',
-  'baseHealth': 'none',
-  'percentage': 'none',
-  'shop': 'none',
-  'food': 'none',
-  'level': 'none'},
- 'maxTriggers': 'none'}
-
 # %%
@@ -1,4 +1,5 @@
 
+import tracemalloc
 import numpy as np
 from sapai import data
 from sapai.battle import Battle
@@ -7,6 +8,10 @@ from sapai.effects import RespawnPet, SummonPet, SummonRandomPet, get_effect_fun
 import sapai.shop
 from sapai.shop import Shop
 from sapai.teams import Team,TeamSlot
+from sapai.pets import empty_pet
+from sapai.foods import empty_food
+from sapai.statuses import status_tier
+from sapai.keys import lf_winner_idx
 
 def onehot(idx, nb_classes):
     oh = np.zeros(nb_classes)
@@ -120,10 +125,14 @@ class Player():
         ### Connect objects
         self.team.player = self
         for slot in self.team:
+            if slot.empty:
+                continue
             slot._pet.player = self
             slot._pet.shop = self.shop
         
         for slot in self.shop:
+            if slot.item is empty_pet or slot.item is empty_food:
+                continue
             slot.item.player = self
             slot.item.shop = self.shop
         
@@ -1083,6 +1092,28 @@ class Player():
         return state_dict
     
     
+    def key(self):
+        """
+        Canonical key of the gameplay-relevant attributes of the player. The 
+        action_history and seed_state are not part of the key, therefore, it
+        does not matter how the player arrived at its current state. 
+        
+        """
+        return (self.team.key(),
+                self.shop.key(),
+                self.lives,
+                self.default_gold,
+                self.gold,
+                self.turn,
+                self.wins,
+                lf_winner_idx[self.lf_winner])
+    
+    
+    def equals(self, other):
+        """ Returns True if the other player has identical gameplay attributes """
+        return type(other) == Player and self.key() == other.key()
+    
+    
     @classmethod
     def from_state(cls, state):
         team = Team.from_state(state["team"])
@@ -1123,22 +1154,33 @@ def get_combined_status(pet1, pet2):
     Statuses are combined based on the tier that they come from.
     
     """
-    status_tier = {
-        0: ["status-weak", "status-poison-attack", "none"],
-        1: ["status-honey-bee"],
-        2: ["status-bone-attack"],
-        3: ["status-garlic-armor"],
-        4: ["status-splash-attack"],
-        5: ["status-coconut-shield", "status-melon-armor", "status-steak-attack", "status-extra-life"],
-    }
+    ### If there is a tie in tier, then pet1 status is used
+    if status_tier[pet2._status] > status_tier[pet1._status]:
+        return pet2.status
+    return pet1.status
+
+
+def test_player_memory(player=None, n=1000, verbose=True):
+    """
+    Benchmark of the memory that is required for every Player, which limits
+    the number of Players that can be held by a CombinatorialSearch. Builds 
+    n Players from the state of the input player and returns the number of 
+    bytes that have been allocated per Player. If no player is provided, a 
+    Player with a full team is used. 
     
-    status_lookup = {}
-    for key,value in status_tier.items():
-        for entry in value:
-            status_lookup[entry] = key
+    """
+    if player == None:
+        player = Player(team=["pet-ant", "pet-fish", "pet-beaver", 
+                              "pet-cricket", "pet-mosquito"])
+    state = player.state
     
-    ### If there is a tie in tier, then pet1 status is used
-    max_idx = np.argmax([status_lookup[pet1.status], 
-                         status_lookup[pet2.status]])
+    tracemalloc.start()
+    start,_ = tracemalloc.get_traced_memory()
+    players = [Player.from_state(state) for x in range(n)]
+    end,_ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
     
-    return [pet1.status, pet2.status][max_idx]
\ No newline at end of file
+    nbytes = (end-start)/len(players)
+    if verbose:
+        print("{:.0f} bytes per Player".format(nbytes))
+    return nbytes
@@ -1,5 +1,6 @@
 
 
+import itertools
 import numpy as np
 
 
@@ -30,4 +31,251 @@ class MockRandomState():
     
     
     def choice(self, *args, **kwargs):
-        return np.random.choice(*args, **kwargs)
\ No newline at end of file
+        return np.random.choice(*args, **kwargs)
+
+class GeneratorRandomState():
+    """
+    Wraps a numpy Generator with the same methods that are used from the 
+    RandomState of a Pet. The Generator is much cheaper to create and to 
+    advance than a RandomState with its 624 word Mersenne Twister state. This 
+    is used for a single Generator that drives all random choices of a 
+    Battle, for example Battle(t0, t1, rng=seed). 
+    
+    Like MockRandomState, the state is not stored by the Pets. The state of 
+    the battle is reproduced by providing the same seed. 
+    
+    """
+    def __init__(self, rng=None):
+        self.rng = np.random.default_rng(rng)
+    
+    
+    def set_state(self, *args, **kwargs):
+        """ Doesn't do anything """
+        return None
+    
+    
+    def get_state(self, *args, **kwargs):
+        return None
+    
+    
+    def choice(self, *args, **kwargs):
+        return self.rng.choice(*args, **kwargs)
+
+
+def spawn_rngs(seed, n):
+    """
+    Returns n independent Generators that are spawned from the seed using a
+    SeedSequence. This provides reproducible streams for parallel workers, 
+    for example one for every MPI rank. 
+    
+    """
+    return [np.random.default_rng(x) 
+            for x in np.random.SeedSequence(seed).spawn(n)]
+
+
+class CounterRandomState():
+    """
+    Counter-based random state using the Philox generator of numpy. The full
+    state is a key and a counter, such that the state can be stored as a few
+    integers and restored in constant time:
+        ["Philox", key0, key1, counter]
+    in contrast to the 624 words of the Mersenne Twister state of a 
+    RandomState. The state may be used as the seed_state of a Player, Shop, 
+    Team, Pet, or Food in the same way as the state of a RandomState. 
+    
+    Every call to choice uses a new Philox stream for the current counter. 
+    The counter is stored in the highest word of the Philox counter, 
+    therefore, streams of different calls never overlap. 
+    
+    """
+    def __init__(self, seed=None, state=None):
+        """
+        Arguments
+        ---------
+        seed: int
+            Seed used to create the key with a SeedSequence
+        state: list
+            State from get_state. If provided, the seed is not used. 
+        
+        """
+        if state is not None:
+            self.set_state(state)
+        else:
+            key = np.random.SeedSequence(seed).generate_state(2, np.uint64)
+            self.key = [int(x) for x in key]
+            self.counter = 0
+    
+    
+    def set_state(self, state):
+        if state[0] != "Philox":
+            raise Exception("State {} is not a Philox state".format(state[0]))
+        self.key = [int(state[1]), int(state[2])]
+        self.counter = int(state[3])
+    
+    
+    def get_state(self):
+        return ["Philox", self.key[0], self.key[1], self.counter]
+    
+    
+    def choice(self, *args, **kwargs):
+        bitgen = np.random.Philox(
+            key=np.array(self.key, dtype=np.uint64),
+            counter=np.array([0,0,0,self.counter], dtype=np.uint64))
+        self.counter += 1
+        return np.random.Generator(bitgen).choice(*args, **kwargs)
+
+
+mock_random_state = MockRandomState()
+
+
+def get_random_state(seed_state):
+    """
+    Returns the random state for the given seed_state. This is a 
+    MockRandomState if seed_state is None, a CounterRandomState for a Philox
+    state, and a RandomState for a Mersenne Twister state. 
+    
+    """
+    if seed_state is None:
+        ### MockRandomState has no state and can be shared by all objects
+        return mock_random_state
+    if seed_state[0] == "Philox":
+        return CounterRandomState(state=seed_state)
+    rs = np.random.RandomState()
+    rs.set_state(seed_state)
+    return rs
+
+
+def get_seed_state(rs):
+    """
+    Returns the state of the random state that can be JSON serialized. None
+    is returned for random states that are not stored, such as 
+    MockRandomState. 
+    
+    """
+    seed_state = rs.get_state()
+    if seed_state is None:
+        return None
+    seed_state = list(seed_state)
+    if seed_state[0] == "MT19937":
+        seed_state[1] = seed_state[1].tolist()
+    return seed_state
+
+
+def distinct_orders(keys):
+    """
+    Returns all orderings of the indices of keys that give distinct sequences
+    of keys. Indices of identical keys are always kept in increasing order, 
+    such that the number of orderings is the number of permutations divided 
+    by the factorial of the size of each group of identical keys. Every 
+    distinct sequence is equally likely for a uniformly random permutation. 
+    
+    """
+    ### Group indices of identical keys in the order of first appearance
+    groups = []
+    group_idx = {}
+    for iter_idx,key in enumerate(keys):
+        if key not in group_idx:
+            group_idx[key] = len(groups)
+            groups.append([])
+        groups[group_idx[key]].append(iter_idx)
+    
+    ### Place the next unused index of each group at every position
+    used = [0 for x in groups]
+    order = []
+    order_list = []
+    def build_orders():
+        if len(order) == len(keys):
+            order_list.append(tuple(order))
+            return
+        for iter_idx,group in enumerate(groups):
+            if used[iter_idx] == len(group):
+                continue
+            order.append(group[used[iter_idx]])
+            used[iter_idx] += 1
+            build_orders()
+            used[iter_idx] -= 1
+            order.pop()
+    
+    build_orders()
+    return order_list
+
+
+class BranchRandomState():
+    """
+    Random state that makes every choice according to a script of choice 
+    indices. This is used to enumerate every possible random branch, for 
+    example in RBattle. 
+    
+    Choices that are made beyond the end of the script are recorded in 
+    branches, such that the other options may be scripted in a future run. 
+    These choices are taken as the first option, unless a RandomState rs is 
+    provided, then the choices are drawn randomly. 
+    
+    """
+    def __init__(self, script=(), rs=None):
+        self.script = script
+        self.rs = rs
+        ### Probability of each option for every choice that was made
+        self.branches = []
+        ### Chosen option for every choice that was made
+        self.chosen = []
+    
+    
+    def set_state(self, *args, **kwargs):
+        """ Doesn't do anything """
+        return None
+    
+    
+    def get_state(self, *args, **kwargs):
+        return None
+    
+    
+    def choice(self, a, size=None, replace=True, p=None):
+        if isinstance(a, (int, np.integer)):
+            a = np.arange(0,a)
+        a = np.asarray(a)
+        if size == None:
+            n = 1
+        else:
+            n = int(np.prod(size))
+        
+        ### Build all possible options with their probability
+        if p is None:
+            p = np.ones((len(a),))/len(a)
+        if replace:
+            options_idx = list(itertools.product(range(len(a)), repeat=n))
+        else:
+            options_idx = list(itertools.permutations(range(len(a)), n))
+        probs = []
+        for temp_idx in options_idx:
+            temp_prob = 1
+            temp_total = 1
+            for x in temp_idx:
+                temp_prob *= p[x]/temp_total
+                if not replace:
+                    temp_total -= p[x]
+            probs.append(temp_prob)
+        
+        choice_idx = len(self.chosen)
+        if choice_idx < len(self.script):
+            chosen = self.script[choice_idx]
+        elif self.rs is not None:
+            chosen = self.rs.choice(len(options_idx), p=np.array(probs))
+        else:
+            chosen = 0
+        self.branches.append(probs)
+        self.chosen.append(chosen)
+        
+        value = a[list(options_idx[chosen])]
+        if size == None:
+            return value[0]
+        return value.reshape(size)
+    
+    
+    @property
+    def probability(self):
+        """ Probability of all choices that were made """
+        prob = 1
+        for probs,chosen in zip(self.branches,self.chosen):
+            prob *= probs[chosen]
+        return prob
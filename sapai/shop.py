@@ -5,11 +5,12 @@
 from random import seed
 import numpy as np
 from sapai.data import data
-from sapai.foods import Food
-from sapai.pets import Pet
+from sapai.foods import Food,empty_food
+from sapai.pets import Pet,empty_pet
 import sapai.foods
 import sapai.pets
-from sapai.rand import MockRandomState
+from sapai.rand import get_random_state,get_seed_state
+from sapai.keys import pack_idx
 
 #%%
 
@@ -102,12 +103,7 @@ class Shop():
                  seed_state=None):
         #### Setting up state
         self.seed_state = seed_state
-        if self.seed_state != None:
-            self.rs = np.random.RandomState()
-            self.rs.set_state(self.seed_state)
-        else:
-            ### Otherwise, set use 
-            self.rs = MockRandomState()
+        self.rs = get_random_state(self.seed_state)
             
         self.turn = turn
         self.pack = pack
@@ -153,13 +149,10 @@ class Shop():
         if idx < 0:
             raise Exception("Unrecognized Shop Object {}".format(obj))
         
-        emptypet = Pet()
-        emptyfood = Food()
-
-        if type(obj) == type(emptypet):
-            self.shop_slots[idx].item = emptypet
-        if type(obj) == type(emptyfood):
-            self.shop_slots[idx].item = emptyfood
+        if type(obj) == Pet:
+            self.shop_slots[idx].item = empty_pet
+        if type(obj) == Food:
+            self.shop_slots[idx].item = empty_food
         
     
     def index(self, obj):
@@ -204,8 +197,7 @@ class Shop():
         for slot in self.shop_slots:
             # New RandomState per roll or else every slot will roll the same pet/food
             if type(slot.rs).__name__ != "MockRandomState":
-                slot.rs = np.random.RandomState()
-                slot.rs.set_state(self.seed_state)
+                slot.rs = get_random_state(self.seed_state)
             slot.roll() 
             self.seed_state = slot.seed_state
             ### Add health and attack from previously purchased cans
@@ -223,8 +215,6 @@ class Shop():
     def add_empty(self):
 
         rules = get_shop_rules(self.turn)
-        emptypet = Pet()
-        emptyfood = Food()
         pslots = rules[0]
         fslots = rules[1]
 
@@ -238,10 +228,10 @@ class Shop():
         if pslots < self.maxpslots:
             eslots = self.maxpslots - pslots
             for n in range(0,eslots):
-                self.append(emptypet)
+                self.append(empty_pet)
 
         if fslots < self.maxfslots:
-            self.append(emptyfood)   
+            self.append(empty_food)
 
     def freeze(self, idx):
         """
@@ -453,17 +443,36 @@ class Shop():
         new_slots += [x for x in fslots]
         
         self.shop_slots = new_slots
+    
+    
+    def key(self):
+        """
+        Canonical key of the items, costs, and frozen of the shop slots and the
+        stats of the shop, where empty slots are 0 such that the key is built
+        only from integers. seed_state is not part of the key.
+        
+        """
+        return (self.turn,
+                self.shop_attack,
+                self.shop_health,
+                pack_idx[self.pack],
+                tuple([0 if x.item.name in ("pet-none", "food-none") 
+                       else (x.item.key(), x.cost, int(x.frozen)) 
+                       for x in self.shop_slots]))
+    
+    
+    def equals(self, other):
+        """ Returns True if the other shop has identical gameplay attributes """
+        return isinstance(other, Shop) and self.key() == other.key()
         
         
     @property
     def state(self):
         #### Ensure that state can be JSON serialized
-        if getattr(self, "rs", False):
-            if type(self.rs).__name__ == "MockRandomState":
-                seed_state = None
-            else:
-                seed_state = list(self.rs.get_state())
-                seed_state[1] = seed_state[1].tolist()
+        ### Rolls use the seed_state of the shop, which is advanced by every
+        ###   roll, rather than rs
+        if self.seed_state is not None:
+            seed_state = get_seed_state(get_random_state(self.seed_state))
         else:
             seed_state = None
         state_dict = {
@@ -485,13 +494,17 @@ class Shop():
             seed_state = state["seed_state"]
         else:
             seed_state = None
-        return cls(
+        shop = cls(
             shop_slots=[ShopSlot.from_state(x) for x in state["shop_slots"]],
             turn=state["turn"],
             shop_attack=state["shop_attack"],
             shop_health=state["shop_health"],
             pack=state["pack"],
             seed_state=seed_state)
+        ### Initializing the shop rolls new slots which advances the 
+        ###   seed_state, therefore, the stored seed_state is restored
+        shop.seed_state = seed_state
+        return shop
     
     
     def __repr__(self):
@@ -523,6 +536,10 @@ class ShopLearn(Shop):
         self.nmax_levelup = 0
         self.nlevelup_bought = 0
         self.shop_names = {}
+        ### Pets and Foods of the shop slots by name with their stats when 
+        ###   built, such that they are reused when ShopLearn is rebuilt, see 
+        ###   get_item
+        self.shop_items = {}
         super().__init__(*args,**kwargs)
         self.max_slots = int(1e6)
     
@@ -574,6 +591,9 @@ class ShopLearn(Shop):
             self.nlevelup_bought += 1
         else:
             raise Exception("Unrecognized ShopSlot {}".format(obj))
+        
+        ### Bought item now belongs to the team and cannot be reused
+        self.shop_items.pop(obj.item.name, None)
             
         ### Rebuild ShopLearn to remove all levelup ShopSlots
         self.update_shop_rules()
@@ -613,12 +633,12 @@ class ShopLearn(Shop):
         if self.npet_bought < self.pslots:
             for pet in self.avail_pets:
                 new_shop_slots_pet.append(
-                    ShopSlot(pet,pack=self.pack,turn=self.turn, seed_state=self.seed_state))
+                    ShopSlot(self.get_item(pet),pack=self.pack,turn=self.turn, seed_state=self.seed_state))
                 self.shop_names[pet] = True
         if self.nfood_bought < self.fslots:
             for food in self.avail_foods:
                 new_shop_slots_food.append(
-                    ShopSlot(food,pack=self.pack,turn=self.turn, seed_state=self.seed_state))
+                    ShopSlot(self.get_item(food),pack=self.pack,turn=self.turn, seed_state=self.seed_state))
                 self.shop_names[food] = True
         if self.nlevelup_bought < self.nmax_levelup:
             if self.pack == "StandardPack":
@@ -627,10 +647,12 @@ class ShopLearn(Shop):
                 levelup_avail_pets = pet_tier_lookup[self.levelup_tier]
             for pet in levelup_avail_pets:
                 if pet not in self.shop_names:
-                    temp_slot = ShopSlot(slot_type="levelup",
+                    ### Built from the Pet such that no random levelup pet 
+                    ###   is rolled only to be replaced
+                    temp_slot = ShopSlot(self.get_item(pet),
                                         pack=self.pack,
                                         turn=self.turn, seed_state=self.seed_state)
-                    temp_slot.item = Pet(pet,seed_state=self.seed_state)
+                    temp_slot.slot_type = "levelup"
                     new_shop_slots_levelup.append(temp_slot)
                     self.shop_names[pet] = True
         
@@ -639,6 +661,27 @@ class ShopLearn(Shop):
                           new_shop_slots_food
             
         
+    def get_item(self, name):
+        """
+        Returns the Pet or Food with the given name for a ShopSlot of 
+        ShopLearn. Every rebuild of ShopLearn must present new items, 
+        therefore, the item is only reused if it has not been bought, has not
+        been connected to a shop, and its stats have not been modified. 
+        
+        """
+        if name in self.shop_items:
+            item,stats = self.shop_items[name]
+            if item.shop is None and \
+                    (item.attack, item.health, item.status) == stats:
+                return item
+        if name.startswith("pet-"):
+            item = Pet(name,seed_state=self.seed_state)
+        else:
+            item = Food(name,seed_state=self.seed_state)
+        self.shop_items[name] = (item, (item.attack, item.health, item.status))
+        return item
+    
+    
     def levelup(self):
         ### Add 1 to the number of levelup pets that can be bought
         self.nmax_levelup += 1
@@ -654,11 +697,7 @@ class ShopLearn(Shop):
     def state(self):
         #### Ensure that state can be JSON serialized
         if getattr(self, "rs", False):
-            if type(self.rs).__name__ == "MockRandomState":
-                seed_state = None
-            else:
-                seed_state = list(self.rs.get_state())
-                seed_state[1] = seed_state[1].tolist()
+            seed_state = get_seed_state(self.rs)
         else:
             seed_state = None
         
@@ -696,6 +735,9 @@ class ShopSlot():
     Class for a slot in the shop
     
     """
+    __slots__ = ("seed_state", "rs", "slot_type", "turn", "pack", "frozen", 
+                 "cost", "item")
+    
     def __init__(self, 
                  obj=None, 
                  slot_type="pet", 
@@ -705,12 +747,7 @@ class ShopSlot():
                  pack="StandardPack",
                  seed_state=None):
         self.seed_state = seed_state
-        if self.seed_state != None:
-            self.rs = np.random.RandomState()
-            self.rs.set_state(self.seed_state)
-        else:
-            ### Otherwise, set use 
-            self.rs = MockRandomState()
+        self.rs = get_random_state(self.seed_state)
        
         self.slot_type = slot_type
         self.turn = turn
@@ -760,10 +797,18 @@ class ShopSlot():
                     self.slot_type = obj
                     name = "none"
                 
+            ### Slots without a given item share the empty singletons until 
+            ###   they are rolled
             if self.slot_type == "pet":
-                self.item = Pet(name,seed_state=self.seed_state)
+                if name == "none":
+                    self.item = empty_pet
+                else:
+                    self.item = Pet(name,seed_state=self.seed_state)
             elif self.slot_type == "food":
-                self.item = Food(name,seed_state=self.seed_state)
+                if name == "none":
+                    self.item = empty_food
+                else:
+                    self.item = Food(name,seed_state=self.seed_state)
                 self.cost = self.item.cost
             elif self.slot_type == "levelup":
                 self.roll_levelup()
@@ -857,11 +902,7 @@ class ShopSlot():
     def state(self):
         #### Ensure that state can be JSON serialized
         if getattr(self, "rs", False):
-            if type(self.rs).__name__ == "MockRandomState":
-                seed_state = None
-            else:
-                seed_state = list(self.rs.get_state())
-                seed_state[1] = seed_state[1].tolist()
+            seed_state = get_seed_state(self.rs)
         else:
             seed_state = None
         state_dict = {
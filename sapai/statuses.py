@@ -0,0 +1,100 @@
+
+
+from sapai.data import data
+
+
+"""
+Statuses are interned as small integer ids. The id 0 is used for no status.
+The effect of each status on damage is stored in tables indexed by the id so
+that damage is calculated with lookups instead of comparing status names.
+
+"""
+
+status_list = ["none"]+[x for x in data["statuses"]]
+status_idx = {x: iter_idx for iter_idx,x in enumerate(status_list)}
+none_id = status_idx["none"]
+splash_id = status_idx["status-splash-attack"]
+
+### Tier of the status that is kept when two pets are combined
+status_tier_dict = {
+    0: ["status-weak", "status-poison-attack", "none"],
+    1: ["status-honey-bee"],
+    2: ["status-bone-attack"],
+    3: ["status-garlic-armor"],
+    4: ["status-splash-attack"],
+    5: ["status-coconut-shield", "status-melon-armor", "status-steak-attack",
+        "status-extra-life"],
+}
+
+### Modifiers of each status. Damage taken by the pet is reduced by reduction
+###   but not below minimum, then increased by the bonus of the attacker and
+###   the vulnerable of the pet. A shield blocks all damage and poison deals
+###   damage equal to the health of the target if any damage is dealt.
+status_modifiers = {
+    "status-garlic-armor": {"reduction": 2, "minimum": 1},
+    "status-melon-armor": {"reduction": 20, "minimum": 0,
+                           "consumed_defend": True},
+    "status-bone-attack": {"bonus": 5},
+    "status-steak-attack": {"bonus": 20, "consumed_attack": True},
+    "status-weak": {"vulnerable": 3},
+    "status-coconut-shield": {"shield": True, "consumed_defend": True},
+    "status-poison-attack": {"poison": True},
+}
+
+status_tier = [0 for x in status_list]
+for key,value in status_tier_dict.items():
+    for entry in value:
+        status_tier[status_idx[entry]] = key
+
+
+def build_status_table(key, default):
+    """ Returns the modifier key of every status indexed by the status id """
+    table = [default for x in status_list]
+    for name,value in status_modifiers.items():
+        table[status_idx[name]] = value.get(key, default)
+    return table
+
+
+status_reduction = build_status_table("reduction", 0)
+status_minimum = build_status_table("minimum", 0)
+status_bonus = build_status_table("bonus", 0)
+status_vulnerable = build_status_table("vulnerable", 0)
+status_shield = build_status_table("shield", False)
+status_poison = build_status_table("poison", False)
+status_consumed_defend = build_status_table("consumed_defend", False)
+status_consumed_attack = build_status_table("consumed_attack", False)
+
+
+def get_damage(value, attacker_status, defender_status, defender_health):
+    """
+    Returns the damage dealt to a pet with defender_status and
+    defender_health by an attack of value from a pet with attacker_status.
+    Statuses are given as ids. Consumption of the statuses is not performed.
+
+    """
+    if status_reduction[defender_status]:
+        value = max(value-status_reduction[defender_status],
+                    status_minimum[defender_status])
+    value += status_bonus[attacker_status]
+    value += status_vulnerable[defender_status]
+    if status_shield[defender_status]:
+        value = 0
+    if status_poison[attacker_status]:
+        if value > 0:
+            value = defender_health
+    return value
+
+
+def get_effect_damage(value, defender_status):
+    """
+    Returns the damage dealt to a pet with defender_status by an effect of
+    value, such as DealDamage. Consumption of the status is not performed.
+
+    """
+    if status_reduction[defender_status]:
+        value = max(value-status_reduction[defender_status],
+                    status_minimum[defender_status])
+    value += status_vulnerable[defender_status]
+    if status_shield[defender_status]:
+        value = 0
+    return value
@@ -0,0 +1,365 @@
+#%%
+import sys,inspect
+import itertools
+import numpy as np
+
+
+"""
+This module implements the resolvers for all target kinds of effects. Each
+resolver is named after the kind of target that it resolves and is looked up
+using target_dict. API description is as follows:
+
+    Arguments
+    ---------
+    apet: Pet or Food
+        Activating Pet or Food
+    apet_idx: list
+        List of two indices that provide the team index and the pet index
+        that has requested to obtain target pets
+    fteam: Team
+        Team of the activating pet
+    oteam: Team
+        Opponent Team. Empty list if there is no opponent.
+    n: int
+        Number of targets for the kinds that use it
+    te: Pet
+        Triggering entity
+
+    Returns
+    -------
+    targets: list
+        List of pets that have been targeted
+    possible: list of lists
+        List of lists of all possible targets
+
+"""
+
+
+def get_effect_target(effect, get_from=False):
+    """
+    Returns the target dictionary of the effect. The data-dictionary is not
+    consistent, therefore, the target may be given with the key to instead of
+    target. If get_from, the target given with the key from is returned.
+
+    """
+    if "target" not in effect:
+        if "to" in effect:
+            target = effect["to"]
+        else:
+            raise Exception("Target not found")
+    else:
+        target = effect["target"]
+
+    if get_from:
+        if "from" not in effect:
+            raise Exception("from not found in effect")
+        else:
+            target = effect["from"]
+
+    if type(target) != dict:
+        raise Exception("This should not be possible")
+    return target
+
+
+def get_alive_idx(team):
+    """ Returns indices of the slots in team with pets that have not fainted """
+    idx = []
+    for iter_idx,temp_slot in enumerate(team):
+        if not temp_slot.empty:
+            ### Skiped if health is less than 0
+            if temp_slot.pet.health > 0:
+                idx.append(iter_idx)
+    return idx
+
+
+def get_adjacent(all_slots,apet_in_all):
+    """ Returns pets to the left and right of apet_in_all in all_slots """
+    ret_pets = []
+    if (apet_in_all-1) > 0:
+        left_slot = all_slots[apet_in_all-1]
+        if not left_slot.empty:
+            ret_pets.append(left_slot.pet)
+    if (apet_in_all+1) < len(all_slots):
+        right_slot = all_slots[apet_in_all+1]
+        if not right_slot.empty:
+            ret_pets.append(right_slot.pet)
+    return ret_pets
+
+
+def AdjacentAnimals(apet,apet_idx,fteam,oteam,n,te):
+    ### First opponent backward, then friendly
+    all_slots = [x for x in oteam[::-1]]
+    apet_in_all = len(all_slots)+apet_idx[1]
+    all_slots += [x for x in fteam]
+    ret_pets = get_adjacent(all_slots,apet_in_all)
+    return ret_pets,[ret_pets]
+
+
+def AdjacentFriends(apet,apet_idx,fteam,oteam,n,te):
+    all_slots = [x for x in fteam]
+    ret_pets = get_adjacent(all_slots,apet_idx[1])
+    return ret_pets,[ret_pets]
+
+
+def All(apet,apet_idx,fteam,oteam,n,te):
+    ret_pets = [fteam[x].pet for x in get_alive_idx(fteam)]
+    ret_pets += [oteam[x].pet for x in get_alive_idx(oteam)]
+    return ret_pets,[ret_pets]
+
+
+def DifferentTierAnimals(apet,apet_idx,fteam,oteam,n,te):
+    pet_tier_lookup = {1: [], 2: [], 3: [], 4: [], 5: [], 6:[]}
+    for temp_idx in get_alive_idx(fteam):
+        temp_tier = fteam[temp_idx].pet.tier
+        pet_tier_lookup[temp_tier].append(temp_idx)
+
+    ### Build lookup of all possible pets
+    idx_list = []
+    for key,value in pet_tier_lookup.items():
+        if len(value) > 0:
+            idx_list.append(value)
+    grid = np.meshgrid(*idx_list)
+    ravel_grid = [x.ravel()  for x in grid]
+    all_idx = np.array(ravel_grid).T
+    all_possible = []
+    for temp_idx in all_idx:
+        temp_chosen = [fteam[x].pet for x in temp_idx]
+        all_possible.append(temp_chosen)
+    if len(all_possible) == 0:
+        return [],[]
+    ### Choose one to return for current
+    choice_idx_range = np.arange(0,len(all_possible))
+    choice_idx = apet.rs.choice(choice_idx_range, (1,))[0]
+    ### Update internal state of random generator
+    apet.seed_state = apet.rs.get_state()
+    ret_pets = all_possible[choice_idx]
+    return ret_pets,all_possible
+
+
+def EachEnemy(apet,apet_idx,fteam,oteam,n,te):
+    ret_pets = [oteam[x].pet for x in get_alive_idx(oteam)]
+    return ret_pets,[ret_pets]
+
+
+def EachFriend(apet,apet_idx,fteam,oteam,n,te):
+    ret_pets = [fteam[x].pet for x in get_alive_idx(fteam)
+                if x != apet_idx[1]]
+    return ret_pets,[ret_pets]
+
+
+def EachShopAnimal(apet,apet_idx,fteam,oteam,n,te):
+    shop = apet.shop
+    if shop == None:
+        return [],[]
+    else:
+        return shop.pets,[shop.pets]
+
+
+def FirstEnemy(apet,apet_idx,fteam,oteam,n,te):
+    oidx = get_alive_idx(oteam)
+    if len(oidx) > 0:
+        return [oteam[oidx[0]].pet],[[oteam[oidx[0]].pet]]
+    else:
+        return [],[]
+
+
+def FriendAhead(apet,apet_idx,fteam,oteam,n,te):
+    ret_pets = []
+    for temp_idx in get_alive_idx(fteam)[::-1]:
+        if temp_idx >= apet_idx[1]:
+            continue
+        ret_pets.append(fteam[temp_idx].pet)
+        if len(ret_pets) >= n:
+            break
+    return ret_pets,[ret_pets]
+
+
+def FriendBehind(apet,apet_idx,fteam,oteam,n,te):
+    ret_pets = []
+    for temp_idx in get_alive_idx(fteam):
+        if temp_idx <= apet_idx[1]:
+            continue
+        ret_pets.append(fteam[temp_idx].pet)
+        if len(ret_pets) >= n:
+            break
+    return ret_pets,[ret_pets]
+
+
+def HighestHealthEnemy(apet,apet_idx,fteam,oteam,n,te):
+    oidx = get_alive_idx(oteam)
+    health_list = [oteam[x].pet.health for x in oidx]
+    if len(health_list) > 0:
+        max_health = np.max(health_list)
+        choice_idx_range = np.where(np.array(health_list) == max_health)[0]
+        choice_idx = apet.rs.choice(choice_idx_range, (1,), replace=False)[0]
+        all_possible = [[oteam[oidx[x]].pet] for x in choice_idx_range]
+        ### Update internal state of random generator
+        apet.seed_state = apet.rs.get_state()
+        ### Dereference max_idx
+        return [oteam[oidx[choice_idx]].pet],all_possible
+    else:
+        return [],[]
+
+
+def LastEnemy(apet,apet_idx,fteam,oteam,n,te):
+    oidx = get_alive_idx(oteam)
+    if len(oidx) > 0:
+        return [oteam[oidx[-1]].pet],[[oteam[oidx[-1]].pet]]
+    else:
+        return [],[]
+
+
+def LeftMostFriend(apet,apet_idx,fteam,oteam,n,te):
+    max_idx = max(get_alive_idx(fteam))
+    return [fteam[max_idx].pet],[[fteam[max_idx].pet]]
+
+
+def Level2And3Friends(apet,apet_idx,fteam,oteam,n,te):
+    fidx = get_alive_idx(fteam)
+    if len(fidx) == 0:
+        return [],[]
+    ret_pets = [fteam[x].pet for x in fidx if fteam[x].pet.level > 1]
+    return ret_pets,[ret_pets]
+
+
+def LowestHealthEnemy(apet,apet_idx,fteam,oteam,n,te):
+    oidx = get_alive_idx(oteam)
+    health_list = [oteam[x].pet.health for x in oidx]
+    if len(health_list) > 0:
+        min_health = np.min(health_list)
+        choice_idx_range = np.where(np.array(health_list) == min_health)[0]
+        choice_idx = apet.rs.choice(choice_idx_range, (1,), replace=False)[0]
+        all_possible = [[oteam[oidx[x]].pet] for x in choice_idx_range]
+        ### Update internal state of random generator
+        apet.seed_state = apet.rs.get_state()
+        ### Dereference max_idx
+        return [oteam[oidx[choice_idx]].pet],all_possible
+    else:
+        return [],[]
+
+
+def RandomEnemy(apet,apet_idx,fteam,oteam,n,te):
+    oidx = get_alive_idx(oteam)
+    ret_pets = []
+    all_possible = []
+    if len(oidx) > 0:
+        if len(oidx) < n:
+            n = len(oidx)
+        all_possible = [[oteam[x].pet for x in temp_idx]
+                        for temp_idx in itertools.combinations(oidx,n)]
+        if len(all_possible) == 0:
+            return [],[]
+        crange = np.arange(0,len(all_possible))
+        cidx = apet.rs.choice(crange,(1,),replace=False)[0]
+        ### Update internal state of random generator
+        apet.seed_state = apet.rs.get_state()
+        ret_pets = all_possible[cidx]
+    return ret_pets,all_possible
+
+
+def RandomFriend(apet,apet_idx,fteam,oteam,n,te):
+    fidx = get_alive_idx(fteam)
+    ret_pets = []
+    all_possible = []
+    if len(fidx) > 0:
+        if len(fidx) < n:
+            n = len(fidx)
+        fidx = [x for x in fidx if x != apet_idx[1]]
+        all_possible = [[fteam[x].pet for x in temp_idx]
+                        for temp_idx in itertools.combinations(fidx,n)]
+        if len(all_possible) == 0:
+            return [],[]
+        crange = np.arange(0,len(all_possible))
+        cidx = apet.rs.choice(crange,(1,),replace=False)[0]
+        ### Update internal state of random generator
+        apet.seed_state = apet.rs.get_state()
+        ret_pets = all_possible[cidx]
+    return ret_pets,all_possible
+
+
+def RightMostFriend(apet,apet_idx,fteam,oteam,n,te):
+    fidx = get_alive_idx(fteam)
+    return [fteam[fidx[0]].pet],[[fteam[fidx[0]].pet]]
+
+
+def Self(apet,apet_idx,fteam,oteam,n,te):
+    return [apet],[[apet]]
+
+
+def StrongestFriend(apet,apet_idx,fteam,oteam,n,te):
+    stat_list = []
+    for temp_idx in get_alive_idx(fteam):
+        temp_stats = fteam[temp_idx].pet.attack + fteam[temp_idx].pet.health
+        stat_list.append(temp_stats)
+    stat_list = np.array(stat_list)
+    max_stats = np.max(stat_list)
+    max_idx = np.where(stat_list == max_stats)[0]
+    all_possible = []
+    for temp_idx in max_idx:
+        all_possible.append(fteam[temp_idx].pet)
+    if len(all_possible) == 0:
+        return [],[]
+    choice = apet.rs.choice(max_idx,(1,),replace=False)[0]
+    ### Update internal state of random generator
+    apet.seed_state = apet.rs.get_state()
+    ret_pets = [fteam[choice].pet]
+    return ret_pets,all_possible
+
+
+def HighestHealthFriend(apet,apet_idx,fteam,oteam,n,te):
+    fidx = get_alive_idx(fteam)
+    health_list = [fteam[x].pet.health for x in fidx]
+    if len(health_list) == 0:
+        return [],[]
+    max_health = np.max(health_list)
+    max_idx = np.where(health_list == max_health)[0]
+    all_possible = []
+    for temp_idx in max_idx:
+        all_possible.append(fteam[fidx[temp_idx]].pet)
+    choice = apet.rs.choice(max_idx,(1,),replace=False)[0]
+    ### Update internal state of random generator
+    apet.seed_state = apet.rs.get_state()
+    ret_pets = [fteam[fidx[choice]].pet]
+    return ret_pets,all_possible
+
+
+def TriggeringEntity(apet,apet_idx,fteam,oteam,n,te):
+    if te != None:
+        return [te],[[te]]
+    else:
+        return [],[]
+
+
+def NonWeakEnemy(apet,apet_idx,fteam,oteam,n,te):
+    possible = []
+    for temp_idx in get_alive_idx(oteam):
+        temp_pet = oteam[temp_idx].pet
+        if temp_pet.status == "status-weak":
+            continue
+        else:
+            possible.append([temp_pet])
+    if len(possible) == 0:
+        return [],[]
+    idx_range = np.arange(0,len(possible))
+    chosen_idx = apet.rs.choice(idx_range,(1,),replace=False)[0]
+    ### Update internal state of random generator
+    apet.seed_state = apet.rs.get_state()
+    return possible[chosen_idx],possible
+
+
+def none(apet,apet_idx,fteam,oteam,n,te):
+    ### No targets
+    return [],[]
+
+
+### Resolvers are looked up by the kind of the target. Helper functions are
+###   not target kinds and are not included.
+curr = sys.modules[__name__]
+mem = inspect.getmembers(curr, inspect.isfunction)
+target_dict = {}
+for temp_name,func in mem:
+    if temp_name.startswith("get_"):
+        continue
+    target_dict[temp_name] = func
+
+#%%
@@ -2,7 +2,8 @@
 #%%
 import numpy
 
-from sapai.pets import Pet
+from sapai.pets import Pet,empty_pet
+from sapai.rand import distinct_orders
 
 
 class Team():
@@ -30,7 +31,8 @@ class Team():
                      for x in range(self.max_slots)]
         for iter_idx,obj in enumerate(obj_list):
             self[iter_idx] = obj
-            self[iter_idx]._pet.team = self
+            if not self[iter_idx].empty:
+                self[iter_idx]._pet.team = self
         self.player = player
         self.shop = shop
         self.pack = "StandardPack"
@@ -41,47 +43,42 @@ class Team():
         target = self[tidx]
         if not target.empty:
             raise Exception("Attempted move to a populated position")
-        ### Move
-        self[tidx] = self[sidx]
-        ### Dereference original position
-        self[sidx] = TeamSlot(seed_state = self.seed_state)
+        ### Move by swapping with the empty slot at the target
+        self.team[tidx] = self.team[sidx]
+        self.team[sidx] = target
             
     
     def move_forward(self, start_idx=0, end_idx=10):
         """
         Adjust the location of the pets in the team, moving them to the furthest 
-        possible forward location using a recursive function. The arg idx may
-        be provided to indicate the first index that is allowed to move 
-        forward. 
+        possible forward location. The arg idx may be provided to indicate the
+        first index that is allowed to move forward. 
+        
+        Performed in a single pass by swapping the slots in-place. The first 
+        empty slot is filled by the next pet behind it that is allowed to 
+        move, until the first empty slot cannot be filled. 
         
         """
-        empty_idx = []
-        filled_idx = []
-        for iter_idx,slot in enumerate(self):
-            if slot.empty:
-                empty_idx.append(iter_idx)
-            else:
-                filled_idx.append(iter_idx)
-        if len(empty_idx) > 0:
-            ### Only need to consider the first empty position 
-            empty_idx = empty_idx[0]
-            
-            ### Find first pet that can fill this empty position
-            found = False
-            for temp_idx in filled_idx:
-                if temp_idx < start_idx:
-                    continue
-                if temp_idx >= end_idx:
-                    continue
-                if empty_idx < temp_idx:
-                    found = True
-                    ### Move pet
-                    self.move(temp_idx,empty_idx)
-                    break
-            
-            ### If a pet was moved, call recurisvely
-            if found:
-                self.move_forward(start_idx,end_idx)
+        team = self.team
+        nslots = len(team)
+        ### First empty slot
+        empty_idx = 0
+        while empty_idx < nslots and not team[empty_idx].empty:
+            empty_idx += 1
+        
+        for iter_idx in range(empty_idx+1, nslots):
+            if iter_idx < start_idx or iter_idx >= end_idx:
+                continue
+            if team[iter_idx].empty:
+                continue
+            ### Move pet into the first empty slot
+            temp_slot = team[empty_idx]
+            team[empty_idx] = team[iter_idx]
+            team[iter_idx] = temp_slot
+            ### Next empty slot, which exists because iter_idx is now empty
+            empty_idx += 1
+            while not team[empty_idx].empty:
+                empty_idx += 1
         
         return
     
@@ -89,34 +86,28 @@ class Team():
     def move_backward(self):
         """
         Adjust the location of the pets in the team, moving them to the furthest 
-        possible backward location using a recursive function. 
+        possible backward location. 
 
         This is useful for summoning purposes
         
         """
-        empty_idx = []
-        filled_idx = []
-        for iter_idx,slot in enumerate(self):
-            if slot.empty:
-                empty_idx.append(iter_idx)
-            else:
-                filled_idx.append(iter_idx)
-        if len(empty_idx) > 0:
-            ### Only need to consider the last empty position 
-            empty_idx = empty_idx[-1]
-            
-            ### Find first pet that can fill this empty position
-            found = False
-            for start_idx in filled_idx[::-1]:
-                if empty_idx > start_idx:
-                    found = True
-                    ### Move pet
-                    self.move(start_idx,empty_idx)
-                    break
-            
-            ### If a pet was moved, call recurisvely
-            if found:
-                self.move_backward()
+        team = self.team
+        ### Last empty slot
+        empty_idx = len(team)-1
+        while empty_idx >= 0 and not team[empty_idx].empty:
+            empty_idx -= 1
+        
+        for iter_idx in range(empty_idx-1, -1, -1):
+            if team[iter_idx].empty:
+                continue
+            ### Move pet into the last empty slot
+            temp_slot = team[empty_idx]
+            team[empty_idx] = team[iter_idx]
+            team[iter_idx] = temp_slot
+            ### Previous empty slot, which exists because iter_idx is now empty
+            empty_idx -= 1
+            while not team[empty_idx].empty:
+                empty_idx -= 1
         
         return
     
@@ -310,7 +301,53 @@ class Team():
     
     
     def copy(self):
-        return Team([x.copy() for x in self], self.battle, self.player,seed_state=self.seed_state)
+        ### __init__ is skipped because it builds 5 empty TeamSlots that would
+        ###   be replaced immediately
+        copy_team = Team.__new__(Team)
+        copy_team.__dict__.update(self.__dict__)
+        copy_team.team = [x.copy() for x in self.team]
+        for slot in copy_team.team:
+            if slot.empty:
+                continue
+            slot._pet.team = copy_team
+        return copy_team
+    
+    
+    def key(self):
+        """
+        Canonical key of the pets in each slot of the team, where empty slots
+        are 0. Order of the slots is part of the key.
+        
+        """
+        return tuple([0 if slot.empty else slot._pet.key() 
+                      for slot in self.team])
+    
+    
+    def equals(self, other):
+        """ Returns True if the other team has identical gameplay attributes """
+        return type(other) == Team and self.key() == other.key()
+    
+    
+    def canonical_key(self):
+        """
+        Key that is identical for every ordering of the pets of the team
+        
+        """
+        return tuple(sorted([slot._pet.key() for slot in self.team 
+                             if not slot.empty]))
+    
+    
+    def distinct_orders(self):
+        """
+        Returns the orderings of the team, in the form used by Player.reorder,
+        that result in distinct teams. Pets with identical keys are 
+        equivalent, therefore, only one ordering of the pets in each group of
+        identical pets is returned. 
+        
+        """
+        keys = [0 if slot.empty else slot._pet.key() 
+                for slot in self.team[0:len(self)]]
+        return distinct_orders(keys)
     
     
     @property
@@ -337,6 +374,8 @@ class Team():
     
         
 class TeamSlot():
+    __slots__ = ("seed_state", "_pet")
+    
     def __init__(self, obj=None, seed_state=None):
         self.seed_state = seed_state
         if type(obj).__name__ == "Pet":
@@ -344,7 +383,7 @@ class TeamSlot():
         elif type(obj).__name__ == "TeamSlot":
             self._pet = obj.pet
         elif type(obj).__name__ == "NoneType":
-            self._pet = Pet(seed_state=self.seed_state)
+            self._pet = empty_pet
         elif type(obj) == str or type(obj) == numpy.str_:
             self._pet = Pet(obj,seed_state=self.seed_state)
         else:
@@ -388,7 +427,14 @@ class TeamSlot():
 
     
     def copy(self):
-        return TeamSlot(self._pet.copy(),seed_state=self.seed_state)
+        copy_slot = TeamSlot.__new__(TeamSlot)
+        copy_slot.seed_state = self.seed_state
+        ### Empty slots keep sharing empty_pet
+        if self._pet is empty_pet:
+            copy_slot._pet = empty_pet
+        else:
+            copy_slot._pet = self._pet.copy()
+        return copy_slot
     
     
     @property